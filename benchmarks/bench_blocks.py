@@ -0,0 +1,75 @@
+"""Read/write throughput of file contents in the block store.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_blocks
+    python -m benchmarks.bench_blocks --small 20000 4096 --large 8 16777216 --wal
+
+Small and large files are written through FileSystem.write_file, rewritten
+(the first extents are given back by the save at the end), then read back with
+read_file and with BlockStore.read_into into one preallocated buffer. With --wal every write is
+logged and the data file is fsync'ed before its log record.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from btfs_engine import FileSystem
+
+
+def run(fs, label, count, size):
+    folder = f"{label}_files"
+    fs.create_folder(folder)
+    names = [f"f{i}" for i in range(count)]
+    for name in names:
+        fs.create_file(name, [folder])
+    payload = memoryview(os.urandom(size))
+    rows = []
+
+    for phase in ("write", "rewrite"):
+        start = time.perf_counter()
+        for name in names:
+            fs.write_file(name, payload, [folder])
+        rows.append((phase, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    for name in names:
+        fs.read_file(name, [folder])
+    rows.append(("read", time.perf_counter() - start))
+
+    buffer = bytearray(size)
+    start = time.perf_counter()
+    for name in names:
+        node = fs.lookup([folder, name])
+        fs.blocks.read_into(node.extents, node.size, buffer)
+    rows.append(("read_into", time.perf_counter() - start))
+
+    for phase, seconds in rows:
+        print(f"{label:<6} {phase:<10} {count:>7} x {size:>10,} B {count / seconds:>10,.0f} files/s "
+              f"{count * size / seconds / 2 ** 20:>9,.1f} MiB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--small", type=int, nargs=2, default=[5000, 4096], metavar=("COUNT", "SIZE"))
+    parser.add_argument("--large", type=int, nargs=2, default=[8, 8 * 2 ** 20], metavar=("COUNT", "SIZE"))
+    parser.add_argument("--wal", action="store_true", help="log every write and fsync the data file")
+    parser.add_argument("-t", type=int, default=6, help="B-tree degree")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fs = FileSystem(args.t)
+        if args.wal:
+            fs.enable_wal(os.path.join(tmp, "state.txt"))
+        fs.enable_blocks(os.path.join(tmp, "state.blocks"))
+        run(fs, "small", *args.small)
+        run(fs, "large", *args.large)
+        fs.save_state(os.path.join(tmp, "state.txt"))
+        print(f"data file: {os.path.getsize(fs.blocks.filename) / 2 ** 20:,.1f} MiB, "
+              f"{fs.blocks.allocator.free_blocks()} free blocks")
+        fs.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Memory benchmark: bytes per entry of a loaded namespace.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_memory --entries 1000000
+"""
+import argparse
+import gc
+import os
+import tempfile
+import tracemalloc
+
+from benchmarks.bench_startup import write_dataset
+from btfs_engine import FileSystem
+
+
+def measure(filename, t, index):
+    gc.collect()
+    tracemalloc.start()
+    fs = FileSystem.load_state(filename, t)
+    if index:
+        fs.enable_index()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return fs, used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--file-ratio", type=float, default=0.9, help="share of the entries that are files")
+    parser.add_argument("-t", type=int, default=6, help="B-tree degree")
+    parser.add_argument("--index", action="store_true", help="also build the name index")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "dataset.txt")
+        write_dataset(filename, args.entries, file_ratio=args.file_ratio)
+        fs, used = measure(filename, args.t, args.index)
+
+    print(f"entries:         {args.entries}")
+    print(f"traced memory:   {used / 2 ** 20:.1f} MiB")
+    print(f"bytes per entry: {used / args.entries:.1f}")
+
+
+if __name__ == "__main__":
+    main()
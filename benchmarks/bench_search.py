@@ -0,0 +1,93 @@
+"""Substring and fuzzy name search: trigram index vs name index vs tree scans.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_search --entries 2000000
+    python -m benchmarks.bench_search --entries 200000 --workers 1 2 4 --queries 20
+
+The namespace is the "varied" one of benchmarks/namespaces.py: distinct,
+word-like file names under 64 top-level folders. Queries are fragments and
+misspellings of names that are there. Without an index, every query scans
+the tree, in this process (1 worker) or split between forked workers.
+"""
+import argparse
+import gc
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.namespaces import generate, write_entries
+from btfs_engine import FileSystem
+
+
+def misspell(name, rnd):
+    i = rnd.randrange(len(name))
+    return name[:i] + rnd.choice("aeiouxyz") + name[i + 1:]
+
+
+def run_queries(fs, queries):
+    gc.collect()                                    # not one left over from building the index
+    start = time.perf_counter()
+    found = 0
+    for kind, query in queries:
+        if kind == "substring":
+            found += len(fs.search_substring(query, "file", True))
+        else:
+            found += len(fs.search_fuzzy(query, 1, "file"))
+    return (time.perf_counter() - start) / len(queries), found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=2000000)
+    parser.add_argument("--queries", type=int, default=50, help="queries of each kind")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("-t", type=int, default=6, help="B-tree degree")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    dataset = generate("varied", args.entries, args.seed)
+    names = [name for entry_type, name, _ in dataset if entry_type == "file"]
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "state.txt")
+        write_entries(filename, dataset)
+        del dataset
+        fs = FileSystem.load_state(filename, args.t)
+
+    samples = rnd.sample(names, args.queries)
+    del names
+    queries = {
+        "substring": [("substring", name.split("_")[1][:5].upper()) for name in samples],
+        "fuzzy": [("fuzzy", misspell(name, rnd)) for name in samples],
+    }
+    print(f"{args.entries:,} entries, {len(fs.inodes):,} in the tree, {os.cpu_count()} cores")
+    print(f"{'search':<26} {'substring ms':>13} {'fuzzy ms':>10} {'found':>10}")
+
+    def report(label):
+        substring, found = run_queries(fs, queries["substring"])
+        fuzzy, fuzzy_found = run_queries(fs, queries["fuzzy"])
+        print(f"{label:<26} {substring * 1e3:>13.2f} {fuzzy * 1e3:>10.2f} {found + fuzzy_found:>10,}")
+
+    for workers in args.workers:
+        fs.scan_workers = workers
+        report(f"scan, {workers} worker{'s' if workers > 1 else ''}")
+
+    for trigrams in (False, True):
+        start = time.perf_counter()
+        fs.enable_index(trigrams=trigrams)
+        seconds = time.perf_counter() - start
+        fs.index = None
+        tracemalloc.start()                         # built again for its size: tracing slows the build down
+        fs.enable_index(trigrams=trigrams)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        label = "trigram index" if trigrams else "name index"
+        print(f"{label}: built in {seconds:.2f} s, {size / 2 ** 20:,.0f} MiB")
+        report(label)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Load generator for btfs_server.py: throughput and latency percentiles.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_server --connections 1 8 32 --depth 1 16
+    python -m benchmarks.bench_server --wal --connections 8 --depth 1 16 64
+    python -m benchmarks.bench_server --port 7341 --connections 8   # against a running server
+
+Without --port a server is started as a subprocess on a free port (with
+--wal it keeps its state in a temporary directory). Each connection keeps
+--depth requests in flight and runs a random mix of creates, deletes,
+renames, moves, listings, stats and searches in its own folder.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from btfs_client import Client
+from btfs_engine import FileSystemError
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, args, tmp):
+    command = [sys.executable, "btfs_server.py", "--port", str(port), "-t", str(args.t)]
+    if args.wal:
+        command += ["--state", os.path.join(tmp, "state.txt")]
+    if args.index:
+        command.append("--index")
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    server.stdout.readline()                        # "listening on ..."
+    return server
+
+
+def request(rnd, home, names):
+    op = rnd.random()
+    name = rnd.choice(names)
+    if op < 0.25:
+        return "create_file", name, home
+    if op < 0.35:
+        return "delete_file", name, home
+    if op < 0.45:
+        return "rename_node", name, rnd.choice(names), home
+    if op < 0.50:
+        return "move_file", name, home, home + ["sub"]
+    if op < 0.55:
+        return "move_file", name, home + ["sub"], home
+    if op < 0.75:
+        return "list_dir", home, None, 16
+    if op < 0.95:
+        return "stat", home + [name]
+    return "search_file", name
+
+
+async def connection(number, args, depth, per_pipe, latencies):
+    client = await Client.connect(args.host, args.port)
+    rnd = random.Random(args.seed + number)
+    home = [f"c{number}"]
+    names = [f"f{j}" for j in range(args.files)]
+    try:
+        await client.create_folder(home[0])
+    except FileSystemError:                         # left over from an earlier run against the same server
+        pass
+    try:
+        await client.create_folder("sub", home)
+    except FileSystemError:
+        pass
+
+    async def pipe(count):
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                await client.call(*request(rnd, home, names))
+            except FileSystemError:                 # name taken, already gone, ...: still a served request
+                pass
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(pipe(per_pipe) for _ in range(depth)))
+    await client.close()
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+async def run(args, connections, depth):
+    per_pipe = args.ops // (connections * depth)
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(connection(i, args, depth, per_pipe, latencies) for i in range(connections)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / elapsed, [percentile(latencies, p) * 1000 for p in PERCENTILES]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="connect to this running server instead of starting one")
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--depth", type=int, nargs="+", default=[1, 16], help="requests in flight per connection")
+    parser.add_argument("--ops", type=int, default=20000, help="requests per run, split between the connections")
+    parser.add_argument("--files", type=int, default=64, help="file names each connection plays with")
+    parser.add_argument("-t", type=int, default=6, help="B-tree degree of a started server")
+    parser.add_argument("--wal", action="store_true", help="start the server with a write-ahead log")
+    parser.add_argument("--index", action="store_true", help="start the server with the name index")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = None
+        if args.port is None:
+            args.port = free_port()
+            server = start_server(args.port, args, tmp)
+        try:
+            print(f"{'conns':>6} {'depth':>6} {'req/s':>10} " + " ".join(f"{f'p{p} ms':>9}" for p in PERCENTILES))
+            for connections in args.connections:
+                for depth in args.depth:
+                    throughput, times = asyncio.run(run(args, connections, depth))
+                    print(f"{connections:>6} {depth:>6} {throughput:>10,.0f} " + " ".join(f"{ms:>9.3f}" for ms in times))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main()
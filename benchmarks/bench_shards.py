@@ -0,0 +1,58 @@
+"""Single-file vs sharded save/load for several numbers of worker processes.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_shards --entries 200000 --workers 1 2 4 8
+
+The default namespace is a scaled-up Data_set.txt (benchmarks/namespaces.py),
+whose many top-level folders are spread over the segments. Worker processes
+only pay off with several cores.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.namespaces import NAMESPACES, generate
+from btfs_engine import FileSystem, read_manifest, split_path
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=200000)
+    parser.add_argument("--namespace", choices=sorted(NAMESPACES), default="realistic")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("-t", type=int, default=6, help="B-tree degree")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    fs = FileSystem(args.t)
+    for entry_type, name, parent in generate(args.namespace, args.entries, args.seed):
+        if entry_type == "folder":
+            fs.create_folder(name, split_path(parent))
+        else:
+            fs.create_file(name, split_path(parent))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        single = os.path.join(tmp, "state.txt")
+        sharded = os.path.join(tmp, "state.shards")
+        save = timed(fs.save_state, single)
+        load = timed(FileSystem.load_state, single, args.t)
+        print(f"{'mode':<14} {'save s':>8} {'load s':>8}")
+        print(f"{'single file':<14} {save:>8.3f} {load:>8.3f}")
+        for workers in args.workers:
+            save = timed(fs.save_shards, sharded, workers=workers)
+            load = timed(FileSystem.load_shards, sharded, args.t, workers=workers)
+            print(f"{f'{workers} workers':<14} {save:>8.3f} {load:>8.3f}")
+        segments = len(read_manifest(sharded)["segments"])
+        print(f"{segments} segments for {len(fs.list_dir())} top-level entries, {os.cpu_count()} cores")
+
+
+if __name__ == "__main__":
+    main()
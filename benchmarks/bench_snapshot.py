@@ -0,0 +1,79 @@
+"""Text snapshot (save_state) vs compact snapshots: size, save and load time.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_snapshot --entries 1000000
+    python -m benchmarks.bench_snapshot --entries 200000 --namespace varied --contents
+
+The namespace is a scaled-up Data_set.txt by default. --contents gives every
+file contents metadata (size, times, extents) as write_file would. The load
+memory column is the peak allocated while loading beyond what the loaded tree
+keeps, measured in a second load under tracemalloc.
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.namespaces import NAMESPACES, generate, write_entries
+from btfs_engine import FileSystem
+
+
+def timed(func, *args):
+    gc.collect()
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def load_overhead(load, filename, t):
+    gc.collect()
+    tracemalloc.start()
+    fs = load(filename, t)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del fs
+    return peak - current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--namespace", choices=sorted(NAMESPACES), default="realistic")
+    parser.add_argument("--contents", action="store_true", help="give every file contents metadata")
+    parser.add_argument("-t", type=int, default=6, help="B-tree degree")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.txt")
+        write_entries(source, generate(args.namespace, args.entries, args.seed))
+        fs = FileSystem.load_state(source, args.t)
+        if args.contents:
+            now = time.time()
+            for block, (_, node) in enumerate(fs.inodes.items()):
+                if not node.is_folder:
+                    node.size, node.mtime, node.ctime, node.extents = 4096 * 3 - 17, now, now, [(block * 3, 3)]
+
+        print(f"{len(fs.inodes) - 1:,} entries ({args.namespace}{', with contents' if args.contents else ''})")
+        print(f"{'format':<14} {'MiB':>8} {'B/entry':>8} {'save s':>8} {'load s':>8} {'load memory MiB':>16}")
+        runs = [("text", "state.txt", fs.save_state, FileSystem.load_state)]
+        for codec in ("none", "zlib", "lzma"):
+            runs.append((f"compact {codec}", f"state.{codec}.btz",
+                         lambda filename, codec=codec: fs.save_compact(filename, codec), FileSystem.load_compact))
+        for label, name, save, load in runs:
+            filename = os.path.join(tmp, name)
+            _, save_seconds = timed(save, filename)
+            loaded, load_seconds = timed(load, filename, args.t)
+            assert len(loaded.inodes) == len(fs.inodes)
+            del loaded
+            size = os.path.getsize(filename)
+            overhead = load_overhead(load, filename, args.t)
+            print(f"{label:<14} {size / 2 ** 20:>8.1f} {size / (len(fs.inodes) - 1):>8.1f} {save_seconds:>8.2f} "
+                  f"{load_seconds:>8.2f} {overhead / 2 ** 20:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Startup benchmark: replaying Data_set.txt through create_* vs. bulk loading it.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup --entries 10000 100000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from btfs_engine import FileSystem, iter_subtree
+
+
+def write_dataset(filename, entries, file_ratio=0.8, seed=0):
+    """Write a synthetic snapshot in the save_state format (parents before children)."""
+    rnd = random.Random(seed)
+    folders = [""]
+    with open(filename, "w") as f:
+        for i in range(entries):
+            parent = rnd.choice(folders)
+            if rnd.random() < file_ratio:
+                f.write(f"file,file{i}.txt,{parent}\n")
+            else:
+                name = f"dir{i}"
+                f.write(f"folder,{name},{parent}\n")
+                folders.append(f"{parent}/{name}" if parent else name)
+
+
+def count_entries(fs):
+    return sum(1 for _ in iter_subtree(fs.tree.root.vals[0])) - 1
+
+
+def time_load(filename, t, max_t, bulk):
+    start = time.perf_counter()
+    fs = FileSystem.load_state(filename, t, bulk=bulk, max_t=max_t)
+    return time.perf_counter() - start, count_entries(fs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("-t", type=int, default=6, help="B-tree degree")
+    parser.add_argument("--max-t", type=int, help="widest degree a large folder may get (default: t)")
+    args = parser.parse_args()
+
+    print(f"{'entries':>10} {'replay (s)':>12} {'bulk (s)':>10} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for entries in args.entries:
+            filename = os.path.join(tmp, f"dataset_{entries}.txt")
+            write_dataset(filename, entries)
+            replay, replay_count = time_load(filename, args.t, args.max_t or args.t, bulk=False)
+            bulk, bulk_count = time_load(filename, args.t, args.max_t or args.t, bulk=True)
+            assert replay_count == bulk_count == entries, (replay_count, bulk_count)
+            print(f"{entries:>10} {replay:>12.3f} {bulk:>10.3f} {replay / bulk:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Benchmark suite for the FileExplorer and FileSystem hot paths, with JSON output.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_suite --entries 20000 -t 3 6 16 --output before.json
+    python -m benchmarks.bench_suite --entries 20000 -t 3 6 16 --compare before.json
+
+Every namespace in benchmarks/namespaces.py is built for every degree t, then
+the same seeded sequence of operations is timed against it. With --repeat N
+each timing is the best of N runs. Folders keep the degree t being measured
+unless --max-t lets growing folders move to wider trees.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.namespaces import NAMESPACES, generate
+from btfs_engine import FileExplorer, FileSystem, FileSystemError, split_path
+
+
+def timed(results, name, count, func, *args):
+    start = time.perf_counter()
+    value = func(*args)
+    results[name] = (count, time.perf_counter() - start)
+    return value
+
+
+def bench_btree(t, entries, seed):
+    # FileExplorer on its own: random inserts, lookups, then deletes (merge/borrow)
+    rnd = random.Random(seed)
+    keys = [f"k{i:08d}" for i in range(entries)]
+    rnd.shuffle(keys)
+    tree = FileExplorer(t)
+    results = {}
+
+    def insert():
+        for k in keys:
+            tree.insert(k, k)
+
+    def search():
+        for k in keys:
+            tree.search(k)
+
+    def delete():
+        for k in keys:
+            tree.delete(tree.root, k)
+
+    timed(results, "btree_insert", entries, insert)
+    rnd.shuffle(keys)
+    timed(results, "btree_search", entries, search)
+    rnd.shuffle(keys)
+    timed(results, "btree_delete", entries, delete)
+    return results
+
+
+def bench_namespace(kind, t, max_t, entries, ops, seed, tmp):
+    rnd = random.Random(seed)
+    dataset = generate(kind, entries, seed)
+    folders = [[]] + [split_path(f"{parent}/{name}" if parent else name)
+                      for entry_type, name, parent in dataset if entry_type == "folder"]
+    files = [(name, split_path(parent)) for entry_type, name, parent in dataset if entry_type == "file"]
+    filename = os.path.join(tmp, f"{kind}_{t}.txt")
+    results = {}
+
+    fs = FileSystem(t, max_t=max_t)
+
+    def insert():
+        for entry_type, name, parent in dataset:
+            if entry_type == "folder":
+                fs.create_folder(name, split_path(parent))
+            else:
+                fs.create_file(name, split_path(parent))
+
+    timed(results, "insert", len(dataset), insert)
+    timed(results, "save_state", len(dataset), fs.save_state, filename)
+    timed(results, "load_state", len(dataset), FileSystem.load_state, filename, t, True, max_t)
+
+    lookups = [rnd.choice(folders) for _ in range(ops)]
+
+    def lookup():
+        for path in lookups:
+            fs._find_node(path)
+
+    timed(results, "lookup", ops, lookup)
+
+    names = [rnd.choice(files)[0] for _ in range(max(1, ops // 1000))]
+
+    def search():
+        for name in names:
+            fs.search_file(name)
+
+    timed(results, "search_scan", len(names), search)
+    timed(results, "enable_index", len(dataset), fs.enable_index)
+    names = [rnd.choice(files)[0] for _ in range(ops)]
+    timed(results, "search_index", ops, search)
+
+    moves = []
+    for i in rnd.sample(range(len(files)), min(ops, len(files))):
+        name, source = files[i]
+        dest = rnd.choice(folders)
+        moves.append((name, source, dest))
+
+    def move():
+        for name, source, dest in moves:
+            try:
+                fs.move_file(name, source, dest)
+            except FileSystemError:                 # name taken in dest: the file stays where it was
+                pass
+
+    timed(results, "move_file", len(moves), move)
+
+    live_files = [node for node in fs.inodes.values() if not node.is_folder]
+    doomed = [(node.name, fs.path_of(node.parent)) for node in rnd.sample(live_files, min(ops, len(live_files)))]
+
+    def delete():
+        for name, path in doomed:
+            fs.delete_file(name, path)
+
+    timed(results, "delete_file", len(doomed), delete)
+
+    top = [path[0] for path in folders if len(path) == 1]
+    remaining = len(fs.inodes) - 1
+
+    def delete_folders():
+        for name in top:
+            fs.delete_folder(name, [])
+
+    timed(results, "delete_folder", remaining, delete_folders)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    best = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(args.repeat):
+            for t in args.t:
+                runs = [("btree", bench_btree(t, args.entries, args.seed))]
+                for kind in args.namespace:
+                    runs.append((kind, bench_namespace(kind, t, args.max_t or t, args.entries, args.ops, args.seed, tmp)))
+                for kind, results in runs:
+                    for op, (count, seconds) in results.items():
+                        key = (kind, t, op)
+                        if key not in best or seconds < best[key][1]:
+                            best[key] = (count, seconds)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "entries": args.entries,
+            "ops": args.ops,
+            "seed": args.seed,
+            "max_t": args.max_t,
+            "repeat": args.repeat,
+        },
+        "results": [
+            {"namespace": kind, "t": t, "op": op, "count": count, "seconds": round(seconds, 6),
+             "ops_per_second": round(count / seconds, 1) if seconds else None}
+            for (kind, t, op), (count, seconds) in best.items()
+        ],
+    }
+
+
+def print_table(report, baseline=None):
+    old = {}
+    if baseline is not None:
+        old = {(r["namespace"], r["t"], r["op"]): r["seconds"] for r in baseline["results"]}
+    header = f"{'namespace':<10} {'t':>4} {'op':<14} {'count':>9} {'seconds':>10} {'ops/s':>12}"
+    print(header + (f" {'vs base':>8}" if baseline is not None else ""), file=sys.stderr)
+    for r in report["results"]:
+        line = (f"{r['namespace']:<10} {r['t']:>4} {r['op']:<14} {r['count']:>9} {r['seconds']:>10.4f} "
+                f"{r['ops_per_second'] or 0:>12,.0f}")
+        before = old.get((r["namespace"], r["t"], r["op"]))
+        if before and r["seconds"]:
+            line += f" {before / r['seconds']:>7.2f}x"    # > 1 means faster than the baseline
+        print(line, file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=20000, help="entries per namespace")
+    parser.add_argument("--ops", type=int, default=5000, help="operations per timed lookup/move/delete run")
+    parser.add_argument("-t", type=int, nargs="+", default=[3, 6, 16], help="B-tree degrees")
+    parser.add_argument("--max-t", type=int, help="widest degree a growing folder may move to (default: t)")
+    parser.add_argument("--namespace", nargs="+", choices=sorted(NAMESPACES), default=sorted(NAMESPACES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="keep the best of this many runs")
+    parser.add_argument("--output", metavar="FILE", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", metavar="FILE", help="JSON report of an earlier run to compare against")
+    args = parser.parse_args()
+
+    report = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_table(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""apply_batch vs the same operations as single calls.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_transaction --files 50000
+    python -m benchmarks.bench_transaction --files 50000 --existing 200000 --wal
+
+Three workloads, each run both ways on a fresh file system:
+- import: --files new files into an empty folder
+- mixed: creates, deletes and renames, a quarter of them on --existing entries
+- spread: --files new files scattered over 100 folders of --existing entries
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from btfs_engine import FileSystem
+
+
+def build(args, tmp, run, mode):
+    fs = FileSystem(args.t)
+    fs.create_folder("drop")
+    fs.create_folder("tree")
+    per = args.existing // 100
+    for j in range(100):
+        fs.create_folder(f"d{j}", ["tree"])
+    fs.apply_batch([["create_file", f"old{i:07d}", ["tree", f"d{i % 100}"]] for i in range(per * 100)] +
+                   [["create_file", f"old{i:07d}", ["drop"]] for i in range(args.existing if run == "mixed" else 0)])
+    if args.wal:
+        fs.enable_wal(os.path.join(tmp, f"{run}_{mode}.txt"))
+    return fs
+
+
+def workloads(args, rnd):
+    names = [f"new{i:07d}" for i in range(args.files)]
+    rnd.shuffle(names)
+    yield "import", [["create_file", name, ["drop"]] for name in names]
+
+    ops = []
+    old = [f"old{i:07d}" for i in rnd.sample(range(args.existing), min(args.existing, args.files // 4))]
+    for name in names[: args.files - len(old)]:
+        ops.append(["create_file", name, ["drop"]])
+    for i, name in enumerate(old):
+        ops.append(["delete_file", name, ["drop"]] if i % 2 else ["rename_node", name, name + ".bak", ["drop"]])
+    rnd.shuffle(ops)
+    yield "mixed", ops
+
+    yield "spread", [["create_file", name, ["tree", f"d{rnd.randrange(100)}"]] for name in names]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=50000, help="operations per workload")
+    parser.add_argument("--existing", type=int, default=100000, help="entries already there")
+    parser.add_argument("-t", type=int, default=6, help="B-tree degree")
+    parser.add_argument("--wal", action="store_true", help="log every operation (single calls fsync each)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'workload':<10} {'ops':>8} {'single ops/s':>14} {'batch ops/s':>14} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for run, ops in workloads(args, random.Random(args.seed)):
+            fs = build(args, tmp, run, "single")
+            start = time.perf_counter()
+            for op, *op_args in ops:
+                getattr(fs, op)(*op_args)
+            single = time.perf_counter() - start
+            fs.close()
+
+            fs = build(args, tmp, run, "batch")
+            start = time.perf_counter()
+            fs.apply_batch(ops)
+            batch = time.perf_counter() - start
+            fs.close()
+            print(f"{run:<10} {len(ops):>8} {len(ops) / single:>14,.0f} {len(ops) / batch:>14,.0f} {single / batch:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Synthetic namespaces for the benchmarks.
+
+Every generator returns a list of (type, name, parent_path) tuples in the
+save_state order (a folder always comes before its entries), so the same list
+can be written as a snapshot or replayed through create_folder/create_file.
+"""
+import os
+import random
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Data_set.txt")
+
+
+def wide(entries, seed=0):
+    # one folder holding every other entry as a file, inserted in random order
+    rnd = random.Random(seed)
+    numbers = list(range(entries - 1))
+    rnd.shuffle(numbers)
+    return [("folder", "wide", "")] + [("file", f"file{i:07d}.dat", "wide") for i in numbers]
+
+
+def deep(entries, depth=64, seed=0):
+    # chains of depth nested folders, each folder holding one file
+    result = []
+    chain = 0
+    while len(result) < entries:
+        parent = ""
+        for level in range(depth):
+            name = f"c{chain}" if level == 0 else f"d{level}"
+            result.append(("folder", name, parent))
+            parent = f"{parent}/{name}" if parent else name
+            result.append(("file", f"f{level}.txt", parent))
+        chain += 1
+    return result[:entries]
+
+
+def realistic(entries, files_per_folder=8, seed=0):
+    # copies of the Data_set.txt tree under set00000, set00001, ..., with files in the leaf folders
+    rnd = random.Random(seed)
+    template = []
+    with open(TEMPLATE, 'r') as f:
+        for line in f:
+            parts = line.strip().split(',')
+            if len(parts) == 3 and parts[0] in ("folder", "file"):
+                template.append(tuple(parts))
+    parents = {parent for _, _, parent in template}
+    leaves = [f"{parent}/{name}" if parent else name
+              for entry_type, name, parent in template
+              if entry_type == "folder" and (f"{parent}/{name}" if parent else name) not in parents]
+
+    extensions = (".mp4", ".png", ".txt", ".json")
+    result = []
+    copy = 0
+    while len(result) < entries:
+        root = f"set{copy:05d}"
+        result.append(("folder", root, ""))
+        for entry_type, name, parent in template:
+            result.append((entry_type, name, f"{root}/{parent}" if parent else root))
+        for leaf in leaves:
+            for j in range(files_per_folder):
+                result.append(("file", f"clip{j}{rnd.choice(extensions)}", f"{root}/{leaf}"))
+        copy += 1
+    return result[:entries]
+
+
+def varied(entries, per_folder=200, seed=0):
+    # distinct, word-like file names ("kavo_rimelu_0000412.txt") in folders of per_folder files under 64 teams
+    rnd = random.Random(seed)
+    syllables = [c + v for c in "bdfgklmnprstvz" for v in "aeiou"]
+    extensions = (".txt", ".csv", ".json", ".py", ".png")
+
+    def word():
+        return "".join(rnd.choice(syllables) for _ in range(rnd.randint(2, 4)))
+
+    result = []
+    folder = 0
+    while len(result) < entries:
+        team = f"team{folder % 64:02d}"
+        if folder < 64:
+            result.append(("folder", team, ""))
+        batch = f"batch{folder // 64:05d}"
+        result.append(("folder", batch, team))
+        for _ in range(per_folder):
+            result.append(("file", f"{word()}_{word()}_{len(result):07d}{rnd.choice(extensions)}", f"{team}/{batch}"))
+        folder += 1
+    return result[:entries]
+
+
+NAMESPACES = {"wide": wide, "deep": deep, "realistic": realistic, "varied": varied}
+
+
+def generate(kind, entries, seed=0):
+    return NAMESPACES[kind](entries, seed=seed)
+
+
+def write_entries(filename, entries):
+    with open(filename, 'w') as f:
+        for entry_type, name, parent in entries:
+            f.write(f"{entry_type},{name},{parent}\n")
@@ -0,0 +1,169 @@
+"""Run a file of file system operations through the engine and report throughput.
+
+One operation per line, arguments separated by spaces (quote names that
+contain spaces, "" is the root folder, paths use '/'):
+
+    create_folder projects
+    create_folder python projects
+    create_file main.py projects/python
+    rename_node main.py app.py projects/python
+    move_file app.py projects/python projects
+    move_folder python projects ""
+    delete_file app.py projects
+    delete_folder projects
+    search_file app.py
+    search_folder python
+    search_pattern *.py
+    search_substring app
+
+Blank lines and lines starting with '#' are skipped. Lines starting with '{'
+are write-ahead log records, so a log segment can be replayed as it is:
+
+    python btfs_batch.py Data_set.txt.wal.000001 --load Data_set.txt
+"""
+import argparse
+import json
+import shlex
+import sys
+import time
+
+from btfs_engine import FileSystem, FileSystemError, split_path
+
+# operation -> (number of name arguments, number of path arguments); missing paths are the root
+OPERATIONS = {
+    "create_folder": (1, 1),
+    "create_file": (1, 1),
+    "delete_file": (1, 1),
+    "delete_folder": (1, 1),
+    "rename_node": (2, 1),
+    "move_file": (1, 2),
+    "move_folder": (1, 2),
+    "search_file": (1, 0),
+    "search_folder": (1, 0),
+    "search_pattern": (1, 0),
+    "search_substring": (1, 0),
+}
+
+
+# operations that only come from write-ahead log records, with engine arguments
+RECORD_OPERATIONS = ("attach_extents", "apply_batch")
+
+
+class BatchError(ValueError):
+    pass
+
+
+def parse_line(line):
+    # -> (operation, args) ready to be passed to the FileSystem method, or None for a blank line
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if line.startswith("{"):
+        record = json.loads(line)
+        op, args = record["op"], record["args"]
+        if op in RECORD_OPERATIONS:                 # write_file contents, transactions: already engine arguments
+            return op, args
+    else:
+        op, *args = shlex.split(line)
+    if op not in OPERATIONS:
+        raise BatchError(f"unknown operation '{op}'")
+    names, paths = OPERATIONS[op]
+    if not names <= len(args) <= names + paths:
+        raise BatchError(f"{op} takes {names} name(s) and up to {paths} path(s), got {len(args)} arguments")
+    args = args[:names] + [split_path(path) if isinstance(path, str) else path for path in args[names:]]
+    return op, args + [[] for _ in range(names + paths - len(args))]
+
+
+def read_batch(filename):
+    operations = []
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            try:
+                parsed = parse_line(line)
+            except (BatchError, ValueError, KeyError) as e:
+                raise BatchError(f"{filename}:{line_no}: {e}") from None
+            if parsed is not None:
+                operations.append((line_no, *parsed))
+    return operations
+
+
+def run_batch(fs, operations, stop_on_error=False, errors=None):
+    # Apply (line_no, op, args) tuples in order. Returns a summary dict;
+    # failed operations are appended to errors as (line_no, op, exception).
+    counts = dict.fromkeys((*OPERATIONS, *RECORD_OPERATIONS), 0)
+    failures = dict.fromkeys(counts, 0)
+    methods = {op: getattr(fs, op) for op in counts}
+    start = time.perf_counter()
+    for line_no, op, args in operations:
+        counts[op] += 1
+        try:
+            methods[op](*args)
+        except FileSystemError as e:
+            failures[op] += 1
+            if errors is not None:
+                errors.append((line_no, op, e))
+            if stop_on_error:
+                break
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    return {
+        "operations": total,
+        "failed": sum(failures.values()),
+        "seconds": elapsed,
+        "ops_per_second": total / elapsed if elapsed else 0.0,
+        "counts": {op: n for op, n in counts.items() if n},
+        "failures": {op: n for op, n in failures.items() if n},
+    }
+
+
+def print_summary(summary):
+    print(f"{summary['operations']} operations in {summary['seconds']:.3f} s "
+          f"({summary['ops_per_second']:,.0f} ops/s), {summary['failed']} failed")
+    for op, n in summary["counts"].items():
+        print(f"  {op:<15} {n:>10} {summary['failures'].get(op, 0):>8} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("batch", help="file of operations, one per line")
+    parser.add_argument("--load", metavar="FILE", help="start from this saved state (save_state format)")
+    parser.add_argument("--save", metavar="FILE", help="save the resulting state to this file")
+    parser.add_argument("-t", type=int, default=6, help="B-tree degree")
+    parser.add_argument("--index", action="store_true", help="maintain the name index while running")
+    parser.add_argument("--stop-on-error", action="store_true", help="stop at the first failed operation")
+    parser.add_argument("--quiet", action="store_true", help="do not list failed operations")
+    parser.add_argument("--metrics", metavar="FILE", help="write B-tree work, latency histograms and tree shapes here")
+    args = parser.parse_args()
+
+    try:
+        operations = read_batch(args.batch)
+    except BatchError as e:
+        parser.exit(2, f"{parser.prog}: error: {e}\n")
+
+    fs = None
+    if args.load:
+        fs = FileSystem.load_state(args.load, args.t)
+        if fs is None:
+            parser.exit(2, f"{parser.prog}: error: no saved state at '{args.load}'\n")
+    if fs is None:
+        fs = FileSystem(args.t)
+    if args.index:
+        fs.enable_index()
+    if args.metrics:
+        fs.enable_metrics()
+
+    errors = []
+    summary = run_batch(fs, operations, args.stop_on_error, errors)
+    if args.metrics:
+        fs.dump_metrics(args.metrics)
+    if not args.quiet:
+        for line_no, op, e in errors:
+            print(f"{args.batch}:{line_no}: {op}: {e}", file=sys.stderr)
+    print_summary(summary)
+
+    if args.save:
+        fs.save_state(args.save)
+
+
+if __name__ == "__main__":
+    main()
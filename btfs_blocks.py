@@ -0,0 +1,217 @@
+"""Block store for file contents.
+
+Contents live in one data file (``Data_set.blocks``) cut into BLOCK_SIZE
+blocks. A file's contents are a list of extents, ``(first block, block
+count)``, handed out by ExtentAllocator, which keeps the free space as sorted,
+coalesced extents. Writes take any buffer and reads fill a buffer through
+memoryview slices, so contents are never copied between Python objects.
+
+The blocks a saved state points to must outlive any later session, so they
+are only given back by commit(), once a newer save no longer needs them. The
+free space as of that save is kept next to the data file (``.free``); blocks
+it does not list as free, and anything past its end, are never reused before
+the next commit.
+"""
+from bisect import bisect_left
+import json
+import os
+import threading
+
+BLOCK_SIZE = 4096
+
+
+class ExtentAllocator:
+    # First fit over the free extents, in block order; the file grows at the end
+    # when none is large enough.
+    def __init__(self):
+        self.starts = []                            # free extents, sorted by first block
+        self.counts = []
+        self.end = 0                                # blocks in use or free below this point
+
+    def allocate(self, count):
+        starts, counts = self.starts, self.counts
+        for i, free in enumerate(counts):
+            if free >= count:
+                start = starts[i]
+                if free == count:
+                    del starts[i]
+                    del counts[i]
+                else:
+                    starts[i] += count
+                    counts[i] -= count
+                return [(start, count)]
+        if starts and starts[-1] + counts[-1] == self.end:
+            # the last free extent is at the end: grow it instead of leaving it behind
+            start = starts.pop()
+            counts.pop()
+        else:
+            start = self.end
+        self.end = start + count
+        return [(start, count)]
+
+    def free(self, start, count):
+        starts, counts = self.starts, self.counts
+        i = bisect_left(starts, start)
+        if i and starts[i - 1] + counts[i - 1] == start:      # merge with the extent before
+            i -= 1
+            start = starts[i]
+            count += counts[i]
+            del starts[i]
+            del counts[i]
+        if i < len(starts) and start + count == starts[i]:    # and with the one after
+            count += counts[i]
+            del starts[i]
+            del counts[i]
+        if start + count == self.end:
+            self.end = start                        # free space at the end is given back
+        else:
+            starts.insert(i, start)
+            counts.insert(i, count)
+
+    def rebuild(self, used):
+        # used: every extent still referenced; whatever lies between them is free
+        self.starts, self.counts = [], []
+        position = 0
+        for start, count in sorted(used):
+            if start > position:
+                self.starts.append(position)
+                self.counts.append(start - position)
+            position = max(position, start + count)
+        self.end = position
+
+    def free_blocks(self):
+        return sum(self.counts)
+
+
+class BlockStore:
+    def __init__(self, filename, block_size=BLOCK_SIZE):
+        self.filename = filename
+        self.block_size = block_size
+        self.file = open(filename, 'r+b' if os.path.exists(filename) else 'w+b', buffering=0)
+        self.fd = self.file.fileno()
+        self.map_filename = filename + '.free'
+        self.allocator = ExtentAllocator()
+        self.allocations = 0                        # extents handed out so far
+        self.recent = []                            # (allocation number, extent) since the last commit
+        self.committed = 0                          # mark of the last commit
+        self.lock = threading.Lock()                # guards the allocator (and the file position without pwrite)
+
+    def load(self, used):
+        # Called once with the extents of every file of the loaded state. Other
+        # saved states may still point to blocks outside them, so the blocks
+        # the last commit kept, and every block past its end, stay in use.
+        used = list(used)
+        blocks = -(-os.fstat(self.fd).st_size // self.block_size)
+        end = 0
+        if os.path.exists(self.map_filename):
+            with open(self.map_filename, 'r') as f:
+                saved = json.load(f)
+            if saved.get("block_size") != self.block_size:
+                raise ValueError(f"'{self.map_filename}' was written for {saved.get('block_size')}-byte blocks")
+            for start, count in saved["free"]:
+                used.append((end, start - end))     # the blocks in use before this free extent
+                end = start + count
+            used.append((end, saved["end"] - end))
+            end = saved["end"]
+        used.append((end, blocks - end))
+        with self.lock:
+            self.allocator.rebuild(extent for extent in used if extent[1] > 0)
+
+    def mark(self):
+        # -> mark to commit() a save with, taken before its snapshot
+        with self.lock:
+            return self.allocations
+
+    def commit(self, used, mark):
+        # A state whose files point to the extents used was saved from a snapshot
+        # taken after mark: everything else, except what was handed out since,
+        # is free again. The free space is then saved for the next load().
+        with self.lock:
+            if mark < self.committed:
+                return                              # a newer save already committed
+            self.committed = mark
+            self.recent = [(number, extent) for number, extent in self.recent if number >= mark]
+            self.allocator.rebuild(list(used) + [extent for _, extent in self.recent])
+            saved = {"block_size": self.block_size, "end": self.allocator.end,
+                     "free": list(zip(self.allocator.starts, self.allocator.counts))}
+        tmp_filename = self.map_filename + '.tmp'
+        with open(tmp_filename, 'w') as f:
+            json.dump(saved, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filename, self.map_filename)
+
+    def write(self, data):
+        # -> extents holding data, written straight from its buffer
+        view = memoryview(data).cast('B')
+        size = len(view)
+        if not size:
+            return []
+        block_size = self.block_size
+        with self.lock:
+            extents = self.allocator.allocate(-(-size // block_size))
+            for extent in extents:
+                self.recent.append((self.allocations, extent))
+                self.allocations += 1
+        position = 0
+        for start, count in extents:
+            chunk = view[position: position + count * block_size]
+            self._write_at(chunk, start * block_size)
+            position += len(chunk)
+        return extents
+
+    def read(self, extents, size):
+        buffer = bytearray(size)
+        self.read_into(extents, size, buffer)
+        return memoryview(buffer)
+
+    def read_into(self, extents, size, buffer):
+        # fill buffer (anything writable, e.g. a bytearray or a mmap) with size bytes of contents
+        view = memoryview(buffer).cast('B')
+        block_size = self.block_size
+        position = 0
+        for start, count in extents:
+            chunk = view[position: min(size, position + count * block_size)]
+            self._read_at(chunk, start * block_size)
+            position += len(chunk)
+        return position
+
+    def _write_at(self, chunk, offset):
+        if hasattr(os, "pwrite"):
+            while chunk:
+                written = os.pwrite(self.fd, chunk, offset)
+                chunk = chunk[written:]
+                offset += written
+        else:
+            with self.lock:
+                self.file.seek(offset)
+                self.file.write(chunk)
+
+    def _read_at(self, chunk, offset):
+        if hasattr(os, "preadv"):
+            while chunk:
+                read = os.preadv(self.fd, [chunk], offset)
+                if not read:
+                    raise EOFError(f"'{self.filename}' ends before offset {offset}")
+                chunk = chunk[read:]
+                offset += read
+        else:
+            with self.lock:
+                self.file.seek(offset)
+                if self.file.readinto(chunk) < len(chunk):
+                    raise EOFError(f"'{self.filename}' ends before offset {offset + len(chunk)}")
+
+    def free(self, extents):
+        with self.lock:
+            for start, count in extents:
+                self.allocator.free(start, count)
+
+    def sync(self):
+        os.fsync(self.fd)
+
+    def close(self):
+        with self.lock:
+            end = self.allocator.end * self.block_size
+        if os.fstat(self.fd).st_size > end:         # drop the free blocks at the end
+            self.file.truncate(end)
+        self.file.close()
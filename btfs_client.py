@@ -0,0 +1,134 @@
+"""asyncio client for btfs_server.py.
+
+    client = await Client.connect("127.0.0.1", 7341)
+    await client.create_folder("projects")
+    entries = await client.list_dir(["projects"], limit=100)
+    await client.close()
+
+Requests can be sent without waiting for the previous answers (pipelining):
+start several calls and gather them. Errors raised by the engine come back
+as the same FileSystemError subclasses.
+"""
+import asyncio
+import json
+
+import btfs_engine
+from btfs_engine import FileSystemError
+
+
+class RemoteError(Exception):
+    # the server rejected the request itself (unknown operation, bad arguments, ...)
+    pass
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = {}                           # request id -> future of its answer
+        self.next_id = 0
+        self.receiver = asyncio.get_running_loop().create_task(self._receive())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=7341, unix=None):
+        if unix:
+            reader, writer = await asyncio.open_unix_connection(unix)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def _receive(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self.pending.pop(response["id"], None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("connection to the server closed"))
+            self.pending.clear()
+
+    def send(self, op, *args):
+        # Queue a request and return the future of its raw answer.
+        self.next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[self.next_id] = future
+        self.writer.write(json.dumps({"id": self.next_id, "op": op, "args": args}).encode() + b"\n")
+        return future
+
+    async def call(self, op, *args):
+        response = await self.send(op, *args)
+        if response["ok"]:
+            return response["result"]
+        error = getattr(btfs_engine, response["error"], None)
+        if isinstance(error, type) and issubclass(error, FileSystemError):
+            raise error(response["message"])
+        raise RemoteError(f"{response['error']}: {response['message']}")
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        await self.receiver
+
+    async def create_folder(self, name, path=[]):
+        return await self.call("create_folder", name, list(path))
+
+    async def create_file(self, name, path=[]):
+        return await self.call("create_file", name, list(path))
+
+    async def delete_file(self, name, path=[]):
+        return await self.call("delete_file", name, list(path))
+
+    async def delete_folder(self, name, path=[]):
+        return await self.call("delete_folder", name, list(path))
+
+    async def rename_node(self, old_name, new_name, path=[]):
+        return await self.call("rename_node", old_name, new_name, list(path))
+
+    async def move_file(self, name, source_path, dest_path):
+        return await self.call("move_file", name, list(source_path), list(dest_path))
+
+    async def move_folder(self, name, source_path, dest_path):
+        return await self.call("move_folder", name, list(source_path), list(dest_path))
+
+    async def search_file(self, name):
+        return await self.call("search_file", name)
+
+    async def search_folder(self, name):
+        return await self.call("search_folder", name)
+
+    async def search_pattern(self, pattern):
+        return await self.call("search_pattern", pattern)
+
+    async def search_substring(self, fragment, target_type="file", ignore_case=False):
+        return await self.call("search_substring", fragment, target_type, ignore_case)
+
+    async def search_fuzzy(self, name, max_distance=2, target_type="file", ignore_case=False):
+        return await self.call("search_fuzzy", name, max_distance, target_type, ignore_case)
+
+    async def list_dir(self, path=[], after=None, limit=None, offset=None):
+        return await self.call("list_dir", list(path), after, limit, offset)
+
+    async def rank(self, name, path=[]):
+        return await self.call("rank", name, list(path))
+
+    async def stat(self, path):
+        return await self.call("stat", list(path))
+
+    async def du(self, path=[]):
+        return await self.call("du", list(path))
+
+    async def count(self, path=[]):
+        return await self.call("count", list(path))
+
+    async def apply_batch(self, operations):
+        # [[op, *args], ...], applied all together or not at all
+        return await self.call("apply_batch", [list(operation) for operation in operations])
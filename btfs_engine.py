@@ -0,0 +1,2809 @@
+"""Headless B-tree file system engine.
+
+Operations return their result and raise a FileSystemError subclass when they
+cannot be applied; nothing here prints or reads from the terminal. The
+interactive menu lives in persistent_BTFS.py, scripted runs in btfs_batch.py.
+"""
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
+import functools
+from itertools import count, islice
+import gc
+import json
+import logging
+import lzma
+import mmap
+import multiprocessing
+import os
+import struct
+import sys
+import threading
+import time
+import weakref
+import zlib
+
+from btfs_blocks import BlockStore
+from btfs_locks import LockTable
+from btfs_metrics import ALLOCATIONS, BORROWS, COMPARISONS, COUNTERS, MERGES, SPLITS, VISITS, Metrics, tree_shape
+from btfs_search import TrigramIndex, edit_distance, trigrams
+from btfs_wal import WriteAheadLog, fsync_dir, read_records, remove_segments
+
+log = logging.getLogger("btfs")
+
+# Errors raised by FileSystem operations
+class FileSystemError(Exception):
+    pass
+
+class PathNotFoundError(FileSystemError):      # a path does not exist or is not a folder
+    pass
+
+class EntryNotFoundError(FileSystemError):     # no file or folder of that name in the folder
+    pass
+
+class EntryExistsError(FileSystemError):       # the folder already has an entry of that name
+    pass
+
+class InvalidMoveError(FileSystemError):       # a folder cannot be moved into its own subtree
+    pass
+
+class ContentsLostError(FileSystemError):      # the block store no longer holds the blocks of a file
+    pass
+
+# "projects/python" -> ["projects", "python"], "" -> [] (the root folder)
+def split_path(path):
+    if path:
+        return path.split("/")
+    return []
+
+def path_str(path):
+    if path:
+        return '/'.join(path)
+    return 'root'
+
+EXPORT_CHUNK = 4096                                 # lines joined into a single write
+
+def write_chunked(out, lines, chunk=EXPORT_CHUNK):
+    # one write per chunk of lines instead of one per line; returns the number of lines
+    buffer = []
+    written = 0
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= chunk:
+            out.write("".join(buffer))
+            written += len(buffer)
+            buffer.clear()
+    if buffer:
+        out.write("".join(buffer))
+        written += len(buffer)
+    return written
+
+# save_state line of a file with contents: the usual three fields, then its
+# size, mtime, ctime and extents ("first:count;first:count")
+def contents_line(node, name, parent_path):
+    extents = ";".join(f"{start}:{count}" for start, count in node.extents)
+    return f"file,{name},{parent_path},{node.size},{node.mtime!r},{node.ctime!r},{extents}\n"
+
+def load_contents(node, parts):
+    node.size = int(parts[3])
+    node.mtime = float(parts[4])
+    node.ctime = float(parts[5])
+    node.extents = [tuple(map(int, extent.split(":"))) for extent in parts[6].split(";") if extent]
+
+def read_groups(filename):
+    # save_state lines of a file -> {parent path: {name: type, or all the fields of a contents line}}, in file order
+    groups = {}
+    with open(filename, 'r') as f:
+        for line in f:
+            parts = line.strip().split(',')
+            if len(parts) == 3 and parts[0] in ("folder", "file"):
+                entry_type, name, parent_path_str = parts
+                groups.setdefault(parent_path_str, {}).setdefault(name, entry_type)
+            elif len(parts) == 7 and parts[0] == "file":
+                groups.setdefault(parts[2], {}).setdefault(parts[1], parts)
+    return groups
+
+# B-tree Node
+class BTreeNode:
+    __slots__ = ("leaf", "keys", "vals", "child", "gen", "size")
+
+    def __init__(self, leaf=False, gen=0):
+        self.leaf = leaf
+        self.keys = []                              # sorted keys
+        self.vals = []                              # vals[i] is the address stored under keys[i]
+        self.child = () if leaf else []             # leaves never get children, so they all share one empty tuple
+        self.gen = gen                              # VersionClock generation the node was created in
+        self.size = 0                               # keys in the subtree rooted here
+
+    def copy(self, gen):
+        x = BTreeNode(self.leaf, gen)
+        x.keys = self.keys[:]
+        x.vals = self.vals[:]
+        x.size = self.size
+        if not x.leaf:
+            x.child = self.child[:]
+        return x
+
+# Snapshot generation shared by the folder trees of a FileSystem. Nodes created
+# before the latest FileSystem.snapshot() may still be read by it, so a tree
+# with a clock copies them (and the path down to them) instead of changing them.
+class VersionClock:
+    __slots__ = ("gen",)
+
+    def __init__(self):
+        self.gen = 0
+
+# File Explorer (B-Tree implementation)
+class FileExplorer:
+    __slots__ = ("root", "t", "clock")
+
+    def __init__(self, t, root=None, clock=None):
+        self.root = BTreeNode(True) if root is None else root
+        self.t = t
+        self.clock = clock                          # VersionClock once a snapshot shares this tree, else None
+
+    def _gen(self):
+        return self.clock.gen if self.clock is not None else 0
+
+    # Copy-on-write: the node about to be changed, copied first if a snapshot may read it
+    def _own_root(self):
+        root = self.root
+        clock = self.clock
+        if clock is not None and root.gen != clock.gen:
+            root = self.root = root.copy(clock.gen)
+        return root
+
+    def _own(self, x, i):                           # x is already owned
+        y = x.child[i]
+        clock = self.clock
+        if clock is not None and y.gen != clock.gen:
+            y = x.child[i] = y.copy(clock.gen)
+        return y
+
+    # Build a tree from sorted keys and their addresses, packing the nodes bottom-up
+    @classmethod
+    def bulk_load(cls, t, keys, vals):
+        tree = cls(t)
+        n = len(keys)
+        if n <= (2 * t) - 1:
+            tree.root.keys = list(keys)
+            tree.root.vals = list(vals)
+            tree.root.size = n
+            return tree
+
+        # leaf level: m leaves separated by m - 1 keys that go up to the parents
+        m = -(-(n + 1) // (2 * t))
+        per, extra = divmod(n - (m - 1), m)
+        nodes, sep_keys, sep_vals = [], [], []
+        pos = 0
+        for j in range(m):
+            count = per + (j < extra)
+            leaf = BTreeNode(True)
+            leaf.keys = keys[pos: pos + count]
+            leaf.vals = vals[pos: pos + count]
+            leaf.size = count
+            nodes.append(leaf)
+            pos += count
+            if j < m - 1:
+                sep_keys.append(keys[pos])
+                sep_vals.append(vals[pos])
+                pos += 1
+
+        # internal levels: group the nodes into parents of at most 2t children
+        while len(nodes) > 2 * t:
+            m = len(nodes)
+            p = -(-m // (2 * t))
+            per, extra = divmod(m, p)
+            parents, up_keys, up_vals = [], [], []
+            pos = 0
+            for j in range(p):
+                count = per + (j < extra)
+                parent = BTreeNode()
+                parent.child = nodes[pos: pos + count]
+                parent.keys = sep_keys[pos: pos + count - 1]
+                parent.vals = sep_vals[pos: pos + count - 1]
+                parent.size = count - 1 + sum(y.size for y in parent.child)
+                parents.append(parent)
+                if j < p - 1:
+                    up_keys.append(sep_keys[pos + count - 1])
+                    up_vals.append(sep_vals[pos + count - 1])
+                pos += count
+            nodes, sep_keys, sep_vals = parents, up_keys, up_vals
+
+        tree.root = BTreeNode()
+        tree.root.child = nodes
+        tree.root.keys = sep_keys
+        tree.root.vals = sep_vals
+        tree.root.size = n
+        return tree
+
+    # Insert a key
+    def insert(self, k, v):                         # k is the key, v is the address that store the key
+        root = self._own_root()                     # root node reference
+        if len(root.keys) == (2 * self.t) - 1:      # in case of the root is full
+            temp = BTreeNode(gen=self._gen())       # create new node
+            self.root = temp                        # Set the new node as new root
+            temp.size = root.size
+            temp.child.insert(0, root)              # set the old root node as the first child of the new root node
+            self.split_child(temp, 0, k > root.keys[-1])    # split the old root node and insert its middle key into new root node
+            self.insert_non_full(temp, k, v)        # insert k into the new tree
+        else:
+            self.insert_non_full(root, k, v)        # else just insert the k into the tree
+
+    # Insert non full
+    def insert_non_full(self, x, k, v):
+        i = bisect_left(x.keys, k)
+        x.size += 1                                 # k ends up somewhere below x
+        if x.leaf:                                  # in case of x is a leaf node
+            x.keys.insert(i, k)
+            x.vals.insert(i, v)
+        else:                                       # in case x is not a leaf node
+            y = x.child[i] if self.clock is None else self._own(x, i)
+            if len(y.keys) == (2 * self.t) - 1:
+                self.split_child(x, i, i == len(x.keys) and k > y.keys[-1])
+                if k > x.keys[i]:
+                    i += 1
+            self.insert_non_full(x.child[i], k, v)
+
+    # Search a key
+    def search(self, k_val, x=None):                # returns (node, index) of the key, or None if it is not in the tree
+        if x is None:
+            x = self.root
+        while True:
+            i = bisect_left(x.keys, k_val)
+            if i < len(x.keys) and x.keys[i] == k_val:
+                return x, i
+            if x.leaf:
+                return None
+            x = x.child[i]
+
+    def get(self, k_val, default=None):
+        found = self.search(k_val)
+        if found is None:
+            return default
+        x, i = found
+        return x.vals[i]
+
+    def contains(self, k_val):
+        return self.search(k_val) is not None
+
+    __contains__ = contains
+
+    # In-order (key, value) pairs from the first key >= start_key (> start_key if
+    # exclusive), produced lazily: getting the first one costs O(log n), every
+    # further one O(1) amortized.
+    def seek(self, start_key, exclusive=False):
+        find = bisect_right if exclusive else bisect_left
+        stack = []
+        x = self.root
+        while True:
+            i = find(x.keys, start_key)
+            stack.append((x, i))
+            if x.leaf:
+                break
+            x = x.child[i]
+        return self._walk(stack)
+
+    def items(self):
+        stack = []
+        x = self.root
+        while True:
+            stack.append((x, 0))
+            if x.leaf:
+                break
+            x = x.child[0]
+        return self._walk(stack)
+
+    # Order statistics, from the subtree sizes kept in every node
+    def __len__(self):
+        return self.root.size
+
+    def rank(self, k_val):
+        # keys that sort before k_val (its index, if it is in the tree)
+        r = 0
+        x = self.root
+        while True:
+            i = bisect_left(x.keys, k_val)
+            r += i
+            if x.leaf:
+                return r
+            for j in range(i):
+                r += x.child[j].size
+            if i < len(x.keys) and x.keys[i] == k_val:
+                return r + x.child[i].size
+            x = x.child[i]
+
+    def seek_index(self, index):
+        # like seek, from the key at position index (0 is the first one)
+        stack = []
+        x = self.root
+        if index >= x.size:
+            return iter(())
+        while not x.leaf:
+            for j, y in enumerate(x.child):
+                if index < y.size:
+                    break
+                index -= y.size
+                if not index:                       # the key right after child j
+                    stack.append((x, j))
+                    return self._walk(stack)
+                index -= 1
+            stack.append((x, j))
+            x = y
+        stack.append((x, index))
+        return self._walk(stack)
+
+    def select(self, index):
+        # (key, value) at position index; negative positions count from the end
+        if index < 0:
+            index += self.root.size
+        if not 0 <= index < self.root.size:
+            raise IndexError(f"position {index} is out of range")
+        return next(self.seek_index(index))
+
+    def flatten(self):
+        # -> (keys, vals): the whole tree in order, as two lists; leaves are copied in one go
+        keys, vals = [], []
+
+        def visit(x):                               # recursion only goes as deep as the tree is high
+            if x.leaf:
+                keys.extend(x.keys)
+                vals.extend(x.vals)
+                return
+            for i, k in enumerate(x.keys):
+                visit(x.child[i])
+                keys.append(k)
+                vals.append(x.vals[i])
+            visit(x.child[-1])
+
+        visit(self.root)
+        return keys, vals
+
+    @staticmethod
+    def _walk(stack):
+        # stack holds (node, index of the next key to yield) from the root down
+        while stack:
+            x, i = stack.pop()
+            if i < len(x.keys):
+                yield x.keys[i], x.vals[i]
+                stack.append((x, i + 1))
+                if not x.leaf:
+                    y = x.child[i + 1]
+                    while True:
+                        stack.append((y, 0))
+                        if y.leaf:
+                            break
+                        y = y.child[0]
+
+    # Split the child
+    # right_edge: k goes after every key of the rightmost child, as when names are
+    # appended in increasing order. Only the last key moves to the new node then,
+    # so the nodes left behind stay full instead of half empty.
+    def split_child(self, x, i, right_edge=False):
+        t = self.t
+        m = (2 * t) - 3 if right_edge and t > 2 else t - 1     # index of the key that goes up
+        y = self._own(x, i)
+        z = BTreeNode(y.leaf, self._gen())
+        x.child.insert(i + 1, z)
+        x.keys.insert(i, y.keys[m])
+        x.vals.insert(i, y.vals[m])
+        z.keys = y.keys[m + 1: (2 * t) - 1]
+        z.vals = y.vals[m + 1: (2 * t) - 1]
+        y.keys = y.keys[0: m]
+        y.vals = y.vals[0: m]
+        z.size = len(z.keys)
+        if not y.leaf:
+            z.child = y.child[m + 1: 2 * t]
+            y.child = y.child[0: m + 1]
+            for c in z.child:
+                z.size += c.size
+        y.size -= z.size + 1
+
+    # Delete a node
+    def delete(self, x, k_val):                     # returns whether k_val was found and removed
+        t = self.t
+        clock = self.clock
+        if clock is not None and x.gen != clock.gen:    # only the root can still be shared: the rest is owned on the way down
+            x = self._own_root()
+        i = bisect_left(x.keys, k_val)
+        if x.leaf:
+            if i < len(x.keys) and x.keys[i] == k_val:
+                x.keys.pop(i)
+                x.vals.pop(i)
+                x.size -= 1
+                return True
+            return False
+        if i < len(x.keys) and x.keys[i] == k_val:
+            removed = self.delete_internal_node(x, k_val, i)
+        else:
+            if len(x.child[i].keys) < t:
+                self.fill(x, i)
+                if i > len(x.keys):                 # the last child was merged into its left sibling
+                    i -= 1
+            removed = self.delete(self._own(x, i), k_val)
+        if removed:
+            x.size -= 1
+        return removed
+
+    def delete_internal_node(self, x, k_val, i):
+        t = self.t
+        if len(x.child[i].keys) >= t:
+            pred_key, pred_val = self.get_predecessor(x, i)
+            x.keys[i] = pred_key
+            x.vals[i] = pred_val
+            return self.delete(self._own(x, i), pred_key)
+        elif len(x.child[i + 1].keys) >= t:
+            succ_key, succ_val = self.get_successor(x, i)
+            x.keys[i] = succ_key
+            x.vals[i] = succ_val
+            return self.delete(self._own(x, i + 1), succ_key)
+        else:
+            self.merge(x, i)
+            return self.delete(x.child[i], k_val)
+
+    def get_predecessor(self, x, i):
+        cur = x.child[i]
+        while not cur.leaf:
+            cur = cur.child[len(cur.child) - 1]
+        return cur.keys[len(cur.keys) - 1], cur.vals[len(cur.vals) - 1]
+
+    def get_successor(self, x, i):
+        cur = x.child[i + 1]
+        while not cur.leaf:
+            cur = cur.child[0]
+        return cur.keys[0], cur.vals[0]
+
+    def merge(self, x, i):
+        t = self.t
+        child = self._own(x, i)
+        sibling = x.child[i + 1]                    # only read, then dropped
+        child.keys.append(x.keys[i])
+        child.vals.append(x.vals[i])
+        child.keys.extend(sibling.keys)
+        child.vals.extend(sibling.vals)
+        child.size += 1 + sibling.size
+        if not child.leaf:
+            child.child.extend(sibling.child)
+        x.keys.pop(i)
+        x.vals.pop(i)
+        x.child.pop(i + 1)
+        if len(x.keys) == 0:
+            self.root = child
+
+    def fill(self, x, i):
+        t = self.t
+        if i != 0 and len(x.child[i - 1].keys) >= t:
+            self.borrow_from_prev(x, i)
+        elif i != len(x.child) - 1 and len(x.child[i + 1].keys) >= t:
+            self.borrow_from_next(x, i)
+        else:
+            if i != len(x.child) - 1:
+                self.merge(x, i)
+            else:
+                self.merge(x, i - 1)
+
+    def borrow_from_prev(self, x, i):
+        child = self._own(x, i)
+        sibling = self._own(x, i - 1)
+
+        child.keys.insert(0, x.keys[i - 1])
+        child.vals.insert(0, x.vals[i - 1])
+        x.keys[i - 1] = sibling.keys.pop()
+        x.vals[i - 1] = sibling.vals.pop()
+        moved = 1
+        if not child.leaf:
+            child.child.insert(0, sibling.child.pop())
+            moved += child.child[0].size
+        child.size += moved
+        sibling.size -= moved
+
+    def borrow_from_next(self, x, i):
+        child = self._own(x, i)
+        sibling = self._own(x, i + 1)
+
+        child.keys.append(x.keys[i])
+        child.vals.append(x.vals[i])
+        x.keys[i] = sibling.keys.pop(0)
+        x.vals[i] = sibling.vals.pop(0)
+        moved = 1
+        if not child.leaf:
+            child.child.append(sibling.child.pop(0))
+            moved += child.child[-1].size
+        child.size += moved
+        sibling.size -= moved
+
+# Metrics probes (see btfs_metrics)
+# While a file system has metrics on, the B-tree primitives are replaced by
+# counting versions that add to the operation running on the calling thread.
+# They are put back when the last one turns metrics off.
+_op_counters = threading.local()                    # .counts: counters of the operation running on this thread
+_probe_users = 0
+_probe_lock = threading.Lock()
+_plain = {}                                         # (owner, name) -> the primitive replaced by a probe
+
+def _search_probe(find):
+    def probe(a, x):
+        counts = getattr(_op_counters, "counts", None)
+        if counts is not None:
+            counts[VISITS] += 1
+            counts[COMPARISONS] += len(a).bit_length()
+        return find(a, x)
+    return probe
+
+def _count_probe(method, counter):
+    @functools.wraps(method)
+    def probe(*args, **kwargs):
+        counts = getattr(_op_counters, "counts", None)
+        if counts is not None:
+            counts[counter] += 1
+        return method(*args, **kwargs)
+    return probe
+
+def _use_probes(delta):
+    global _probe_users
+    with _probe_lock:
+        _probe_users += delta
+        if _probe_users == 1 and not _plain:
+            module = sys.modules[__name__]
+            probes = [(module, "bisect_left", _search_probe(bisect_left)),
+                      (module, "bisect_right", _search_probe(bisect_right))]
+            for owner, name, counter in ((FileExplorer, "split_child", SPLITS), (FileExplorer, "merge", MERGES),
+                                         (FileExplorer, "borrow_from_prev", BORROWS),
+                                         (FileExplorer, "borrow_from_next", BORROWS),
+                                         (BTreeNode, "__init__", ALLOCATIONS)):
+                probes.append((owner, name, _count_probe(getattr(owner, name), counter)))
+            for owner, name, probe in probes:
+                _plain[owner, name] = getattr(owner, name)
+                setattr(owner, name, probe)
+        elif _probe_users == 0:
+            for (owner, name), plain in _plain.items():
+                setattr(owner, name, plain)
+            _plain.clear()
+
+# File System Node (representing a file or folder)
+class FileSystemNode:
+    __slots__ = ("name", "is_folder", "parent", "ino", "children", "size", "ctime", "mtime", "extents", "totals")
+
+    def __init__(self, name, node_type, parent=None, ino=None, now=None):
+        self.name = name
+        self.is_folder = node_type == "folder"
+        self.parent = parent                        # folder FileSystemNode holding this entry, None for root
+        self.ino = ino                              # integer id, key of FileSystem.inodes
+        self.children = None                        # FileExplorer of a folder, created by its first entry
+        self.size = 0                               # bytes of contents
+        self.ctime = self.mtime = time.time() if now is None else now
+        self.extents = None                         # [(first block, block count), ...] in FileSystem.blocks once written
+        self.totals = None                          # folders, with FileSystem.enable_totals(): [files, folders, bytes] below
+
+    @property
+    def type(self):
+        return "folder" if self.is_folder else "file"
+
+# Every entry below node (node included), without recursion
+def iter_subtree(node):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        if node.children is not None:
+            nodes = [node.children.root]
+            while nodes:
+                x = nodes.pop()
+                nodes.extend(x.child)
+                stack.extend(x.vals)
+
+# Name index: name -> {inode id: FileSystemNode} for every entry of the namespace.
+# A dict answers exact lookups; the names are also kept in a FileExplorer so
+# prefix and glob queries only visit the names that can match. Paths are
+# rebuilt from the parent pointers, so renames and moves only touch one entry.
+class NameIndex:
+    def __init__(self, t, trigrams=False):
+        self.by_name = {}
+        self.names = FileExplorer(t)
+        self.grams = TrigramIndex() if trigrams else None   # for substring and fuzzy searches
+
+    def add(self, node):
+        entries = self.by_name.get(node.name)
+        if entries is None:
+            entries = self.by_name[node.name] = {}
+            self.names.insert(node.name, entries)
+            if self.grams is not None:
+                self.grams.add(node.name)
+        entries[node.ino] = node
+
+    def remove(self, node, name=None):              # name: the name node was indexed under, if it changed since
+        name = node.name if name is None else name
+        entries = self.by_name.get(name)
+        if entries is None or entries.pop(node.ino, None) is None:
+            return
+        if not entries:
+            del self.by_name[name]
+            self.names.delete(self.names.root, name)
+            if self.grams is not None:
+                self.grams.remove(name)
+
+    def lookup(self, name):
+        return list(self.by_name.get(name, {}).values())
+
+    def prefix(self, prefix):
+        results = []
+        for name, entries in self.names.seek(prefix):
+            if not name.startswith(prefix):
+                break
+            results.extend(entries.values())
+        return results
+
+    def glob(self, pattern):
+        # only names starting with the pattern's literal prefix can match it
+        literal = pattern
+        for i, ch in enumerate(pattern):
+            if ch in "*?[":
+                literal = pattern[:i]
+                break
+        results = []
+        for name, entries in self.names.seek(literal):
+            if not name.startswith(literal):
+                break
+            if fnmatchcase(name, pattern):
+                results.extend(entries.values())
+        return results
+
+    def _matching(self, names, matches):
+        # names: candidates from the trigram index, None for every name
+        by_name = self.by_name
+        results = []
+        for name in by_name if names is None else names:
+            if matches(name):
+                results.extend(by_name[name].values())
+        return results
+
+    def substring(self, fragment, ignore_case=False):
+        names = None
+        if self.grams is not None:
+            grams = trigrams(fragment)
+            names = self.grams.candidates(grams, len(grams))
+        if ignore_case:
+            fragment = fragment.lower()
+            return self._matching(names, lambda name: fragment in name.lower())
+        return self._matching(names, lambda name: fragment in name)
+
+    def fuzzy(self, query, max_distance, ignore_case=False):
+        names = None
+        if self.grams is not None:
+            grams = trigrams(query)
+            names = self.grams.candidates(grams, len(grams) - 3 * max_distance)
+        if ignore_case:
+            query = query.lower()
+            return self._matching(names, lambda name: edit_distance(query, name.lower(), max_distance) <= max_distance)
+        return self._matching(names, lambda name: edit_distance(query, name, max_distance) <= max_distance)
+
+# NameIndex shared between threads (FileSystem.enable_locking)
+class SynchronizedNameIndex(NameIndex):
+    def __init__(self, t, trigrams=False):
+        super().__init__(t, trigrams)
+        self.lock = threading.Lock()
+
+    def add(self, node):
+        with self.lock:
+            super().add(node)
+
+    def remove(self, node, name=None):
+        with self.lock:
+            super().remove(node, name)
+
+    def lookup(self, name):
+        with self.lock:
+            return super().lookup(name)
+
+    def prefix(self, prefix):
+        with self.lock:
+            return super().prefix(prefix)
+
+    def glob(self, pattern):
+        with self.lock:
+            return super().glob(pattern)
+
+    def substring(self, fragment, ignore_case=False):
+        with self.lock:
+            return super().substring(fragment, ignore_case)
+
+    def fuzzy(self, query, max_distance, ignore_case=False):
+        with self.lock:
+            return super().fuzzy(query, max_distance, ignore_case)
+
+# Path-resolution cache: path tuple -> folder FileSystemNode, least recently used first.
+# Entries are dropped when a folder on their path is renamed, moved or deleted.
+class PathCache:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, path):
+        node = self.entries.get(path)
+        if node is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(path)
+        self.hits += 1
+        return node
+
+    def peek(self, path):                           # no counting, no reordering
+        return self.entries.get(path)
+
+    def put(self, path, node):
+        self.entries[path] = node
+        self.entries.move_to_end(path)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, prefix):
+        # bounded by the capacity, and only paid by folder renames, moves and deletes
+        n = len(prefix)
+        stale = [path for path in self.entries if path[:n] == prefix]
+        for path in stale:
+            del self.entries[path]
+        self.invalidations += len(stale)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+# On-disk page format
+# page 0 is the header, every BTreeNode starts a run of consecutive pages (one,
+# unless the node belongs to a wide folder and needs more):
+#   leaf (u8), key count (u16),
+#   per key: flags (u8, ENTRY_FOLDER | ENTRY_CONTENTS), degree of the folder's own tree (u16), root page
+#            of that tree (u32, 0 if empty or a file), entries in that tree (u32), name length (u16), name,
+#            then for a file with contents: size (u64), mtime, ctime (f64), extent count (u32)
+#            and the (first block, block count) of each extent (u64 each),
+#   for internal nodes: key count + 1 child page numbers (u32), then the key count of each child's subtree (u32)
+# so subtree sizes are known without faulting the nodes in.
+PAGE_MAGIC = b"BTFSPAGE"
+PAGE_VERSION = 4
+PAGE_SIZE = 4096
+MAX_NAME_BYTES = 255
+PAGE_HEADER = struct.Struct("<8sHIHIIHI")           # magic, version, page size, t, page count, root page, root degree, root entries
+NODE_HEADER = struct.Struct("<BH")
+ENTRY_HEADER = struct.Struct("<BHIIH")
+CONTENTS_HEADER = struct.Struct("<QddI")
+ENTRY_FOLDER = 1
+ENTRY_CONTENTS = 2
+
+# B-tree node whose contents stay in the page file until first accessed
+class PagedBTreeNode(BTreeNode):
+    __slots__ = ("_pages", "_page_no", "_owner")
+
+    def __init__(self, pages, page_no, owner, size):
+        self.gen = 0
+        self.size = size
+        self._pages = pages
+        self._page_no = page_no
+        self._owner = owner                         # folder FileSystemNode whose tree this node belongs to
+
+    def __getattr__(self, name):                    # only called while leaf/keys/vals/child are not set yet
+        if name in ("leaf", "keys", "vals", "child"):
+            self._pages.fault(self)
+            return getattr(self, name)
+        raise AttributeError(name)
+
+    def loaded(self):
+        try:
+            object.__getattribute__(self, "keys")   # bypasses __getattr__, so this never faults the page in
+        except AttributeError:
+            return False
+        return True
+
+# Read-only, mmap-backed view of a file written by FileSystem.save_pages
+class PageFile:
+    def __init__(self, filename, fs):
+        self.fs = fs                                # decoded entries get their inode ids from this file system
+        self.lock = threading.Lock()                # held while a node is decoded
+        _page_files.add(self)
+        self.file = open(filename, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.page_size, self.t, self.page_count,
+         self.root_page, self.root_degree, self.root_size) = PAGE_HEADER.unpack_from(self.mm, 0)
+        if magic != PAGE_MAGIC or version != PAGE_VERSION:
+            self.close()
+            raise ValueError(f"'{filename}' is not a version {PAGE_VERSION} page file")
+        if self.t != fs.t:
+            self.close()
+            raise ValueError(f"'{filename}' was written with t={self.t}, not t={fs.t}")
+
+    def node(self, page_no, owner, size):
+        return PagedBTreeNode(self, page_no, owner, size)
+
+    def fault(self, x):
+        # Snapshot walks (background checkpoints) and locked-mode readers may fault
+        # the same node in at once: only the first decodes it, and keys, which
+        # loaded() looks at, is set last so the node is never seen half decoded.
+        with self.lock:
+            if x.loaded():
+                return
+            mm = self.mm
+            offset = x._page_no * self.page_size
+            leaf, count = NODE_HEADER.unpack_from(mm, offset)
+            offset += NODE_HEADER.size
+            keys = []
+            vals = []
+            for _ in range(count):
+                flags, degree, child_page, size, name_len = ENTRY_HEADER.unpack_from(mm, offset)
+                offset += ENTRY_HEADER.size
+                node = self.fs._new_node(str(mm[offset: offset + name_len], 'utf-8'),
+                                         "folder" if flags & ENTRY_FOLDER else "file", x._owner)
+                offset += name_len
+                if flags & ENTRY_CONTENTS:
+                    node.size, node.mtime, node.ctime, extents = CONTENTS_HEADER.unpack_from(mm, offset)
+                    offset += CONTENTS_HEADER.size
+                    blocks = struct.unpack_from(f"<{2 * extents}Q", mm, offset)
+                    offset += 16 * extents
+                    node.extents = list(zip(blocks[::2], blocks[1::2]))
+                if child_page:
+                    node.children = FileExplorer(degree, PagedBTreeNode(self, child_page, node, size))
+                keys.append(node.name)
+                vals.append(node)
+            if leaf:
+                child = ()
+            else:
+                refs = struct.unpack_from(f"<{2 * (count + 1)}I", mm, offset)
+                child = [PagedBTreeNode(self, p, x._owner, size) for p, size in zip(refs[:count + 1], refs[count + 1:])]
+            x.leaf = bool(leaf)
+            x.vals = vals
+            x.child = child
+            x.keys = keys
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+# Forked workers (shard_map) read the tree, so they may decode pages. A worker
+# forked while another thread is decoding would start with that lock taken and
+# nobody left to release it: every open page file's lock is taken around fork()
+# instead, so it is free on both sides afterwards.
+_page_files = weakref.WeakSet()
+_forking = []
+
+def _lock_page_files():
+    _forking[:] = list(_page_files)
+    for pages in _forking:
+        pages.lock.acquire()
+
+def _unlock_page_files():
+    for pages in _forking:
+        pages.lock.release()
+    _forking.clear()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=_lock_page_files, after_in_parent=_unlock_page_files,
+                        after_in_child=_unlock_page_files)
+
+# Sharded snapshot format
+# A JSON manifest lists segments holding the save_state lines of whole top-level
+# folders: one segment per folder, or SHARD_SEGMENTS segments sharing them
+# round-robin if there are more. Segment 0 holds the entries of the root folder
+# itself. Segments are written by forked worker processes reading a snapshot and
+# parsed by workers started from a fork server, which only need the file. Every save
+# writes a new generation of segments, used once the manifest naming it is in place.
+SHARD_FORMAT = "btfs-shards"
+SHARD_VERSION = 1
+SHARD_SEGMENTS = 64
+
+_shard_source = None                                # (Snapshot, top-level folders of each segment), inherited by forked writers
+_shard_lock = threading.Lock()
+
+def shard_map(func, jobs, workers=None, start_method="fork"):
+    # [func(*job) for job in jobs], spread over worker processes if there are
+    # several jobs and workers (all the cores by default). Workers reading the
+    # tree are forked to inherit it; workers that only need their job can use
+    # "forkserver", which never copies this process's threads or locks.
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(jobs))
+    if workers <= 1 or start_method not in multiprocessing.get_all_start_methods():
+        return [func(*job) for job in jobs]
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(start_method)) as pool:
+        return list(pool.map(func, *zip(*jobs)))
+
+def _write_segment(i, filename):
+    snap, segments = _shard_source
+    if i == 0:
+        lines = snap.iter_state_lines(max_depth=1)
+    else:
+        lines = (line for name, node in segments[i - 1]
+                 for line in snap.iter_state_lines(folder_node=node, folder_path=name))
+    with open(filename, 'w') as f:
+        entries = write_chunked(f, lines)
+        f.flush()
+        os.fsync(f.fileno())
+    return entries
+
+def is_manifest(filename):
+    with open(filename, 'r') as f:
+        return f.read(1) == "{"                     # save_state files start with a type or "#lsn"
+
+def read_manifest(filename):
+    with open(filename, 'r') as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SHARD_FORMAT or manifest.get("version") != SHARD_VERSION:
+        raise ValueError(f"'{filename}' is not a version {SHARD_VERSION} shard manifest")
+    return manifest
+
+# Parallel scans
+# A search without the name index walks the whole tree. Once the file system
+# holds PARALLEL_SCAN_MIN_ENTRIES entries, the top levels (at most
+# SCAN_SPLIT_DEPTH of them) are checked here and the subtrees below them are
+# shared out between forked worker processes, a few jobs per worker.
+PARALLEL_SCAN_MIN_ENTRIES = 200000
+SCAN_SPLIT_DEPTH = 3
+SCAN_JOBS_PER_WORKER = 4
+
+_scan_source = None                                 # (FileSystem, name test, folders wanted, subtrees of each job), inherited by forked scanners
+_scan_lock = threading.Lock()
+
+def _scan_segment(i):
+    # -> paths (without "root") of the matching entries below the folders of job i
+    fs, matches, folders, segments = _scan_source
+    results = []
+    for path, folder_node in segments[i]:
+        base = len(path) - 1
+        full = list(path)
+        for depth, node in fs.walk(folder_node):
+            del full[base + depth:]
+            full.append(node.name)
+            if node.is_folder == folders and matches(node.name):
+                results.append(list(full))
+    return results
+
+# Compact snapshot format
+# A header line "#btfs-compact <version> <codec> <lsn>", then blocks of records,
+# each one a u32 length followed by the block compressed with the codec, and a
+# zero length to end the file. Records are the entries in walk order (each
+# folder directly followed by its own entries, in name order), one line each:
+#   <type><depth>\t<shared>\t<rest of the name>
+# with type "d" for folders and "f" for files, or type "c" for a file with contents:
+#   c<depth>\t<shared>\t<rest of the name>\t<size>\t<mtime>\t<ctime>\t<extents>
+# shared is how many leading characters the name has in common with the entry
+# before it in the same folder (front coding), and the depth tells which open
+# folder the entry is in, so no path is written out. Blocks end on a line
+# boundary; the writer and the parser only hold one block at a time.
+COMPACT_MAGIC = b"#btfs-compact"
+COMPACT_VERSION = 1
+COMPACT_BLOCK = 1 << 18                             # bytes of records compressed together
+COMPACT_CODECS = {
+    "none": (bytes, bytes),
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+BLOCK_HEADER = struct.Struct("<I")
+
+def is_compact(filename):
+    with open(filename, 'rb') as f:
+        return f.read(len(COMPACT_MAGIC)) == COMPACT_MAGIC
+
+def read_compact_header(f):
+    # -> (codec, lsn) from the first line of a compact snapshot open in binary mode
+    parts = f.readline().split()
+    if (len(parts) != 4 or parts[0] != COMPACT_MAGIC or parts[1] != b"%d" % COMPACT_VERSION
+            or parts[2].decode() not in COMPACT_CODECS):
+        raise ValueError(f"'{f.name}' is not a version {COMPACT_VERSION} compact snapshot")
+    return parts[2].decode(), int(parts[3])
+
+def iter_compact_lines(snap):
+    # the records of snap, in the compact snapshot format
+    last = [""]                                     # last[d]: name of the entry before, in the open folder at depth d + 1
+    for depth, name, node in snap.walk():
+        if "\t" in name or "\n" in name:
+            raise ValueError(f"Name '{name}' cannot be stored in a compact snapshot")
+        previous = last[depth - 1]
+        shared = 0
+        limit = min(len(previous), len(name))
+        while shared < limit and previous[shared] == name[shared]:
+            shared += 1
+        last[depth - 1] = name
+        if node.is_folder:
+            del last[depth:]
+            last.append("")
+            yield f"d{depth}\t{shared}\t{name[shared:]}\n"
+        elif node.extents is None:
+            yield f"f{depth}\t{shared}\t{name[shared:]}\n"
+        else:
+            extents = ";".join(f"{start}:{count}" for start, count in node.extents)
+            yield f"c{depth}\t{shared}\t{name[shared:]}\t{node.size}\t{node.mtime!r}\t{node.ctime!r}\t{extents}\n"
+
+def read_compact_blocks(f, decompress):
+    # the text of every block of an open compact snapshot, after its header
+    while True:
+        header = f.read(BLOCK_HEADER.size)
+        if len(header) < BLOCK_HEADER.size:
+            raise ValueError(f"'{f.name}' is truncated")
+        (size,) = BLOCK_HEADER.unpack(header)
+        if not size:
+            return
+        data = f.read(size)
+        if len(data) < size:
+            raise ValueError(f"'{f.name}' is truncated")
+        yield str(decompress(data), 'utf-8')
+
+ROOT_INO = 1
+DEFAULT_PATH_CACHE_SIZE = 1024
+RECLAIM_BATCH = 256                                 # dropped entries released per mutation
+MAX_FOLDER_DEGREE = 64                              # widest B-tree a growing folder is moved to
+
+WAL_OPERATIONS = ("create_folder", "create_file", "delete_file", "delete_folder",
+                  "rename_node", "move_file", "move_folder", "attach_extents", "apply_batch")
+BATCH_OPERATIONS = ("create_folder", "create_file", "delete_file", "delete_folder",
+                    "rename_node", "move_file", "move_folder")
+BATCH_REBUILD_RATIO = 8                             # a folder's tree is rebuilt once a batch changes 1/8 of it
+
+# Methods wrapped by FileSystem.enable_locking. False: the operation shares the
+# tree with the others and locks the folders it works on; True: it works on the
+# whole tree and runs alone; an attribute name: alone only while that attribute
+# (the name index, the folder totals) is None, as it then walks the tree instead.
+LOCKED_OPERATIONS = {
+    "lookup": False, "stat": False, "list_dir": False, "rank": False,
+    "create_folder": False, "create_file": False, "delete_file": False, "delete_folder": False,
+    "rename_node": False, "move_file": False, "move_folder": False,
+    "write_file": False, "read_file": False, "attach_extents": False,
+    "search_file": "index", "search_folder": "index", "search_prefix": "index", "search_glob": "index",
+    "search_pattern": "index", "search_substring": "index", "search_fuzzy": "index",
+    "du": "_totals", "count": "_totals",
+    "write_tree": True, "save_pages": True, "enable_index": True, "checkpoint": True, "snapshot": True,
+    "apply_batch": True, "enable_totals": True,
+}
+# Methods timed by FileSystem.enable_metrics
+METERED_OPERATIONS = (*LOCKED_OPERATIONS, "save_state", "save_shards", "save_compact", "export_state", "reclaim")
+FOLDER_METRICS_MIN_ENTRIES = 1000                   # folders listed one by one in dump_metrics
+LOCK_RETRIES = 8                                    # attempts to lock two folders that keep moving
+
+# Locks held by one operation in concurrent mode, released when it returns
+class _Operation:
+    __slots__ = ("held", "lsn")
+
+    def __init__(self):
+        self.held = []                              # release functions, in acquisition order
+        self.lsn = None                             # WAL record to wait for once the locks are released
+
+    def release(self):
+        while self.held:
+            self.held.pop()()
+
+# Operations queued for FileSystem.apply_batch, applied when the with block
+# of FileSystem.transaction() ends without an exception (or on commit()).
+class Transaction:
+    def __init__(self, fs):
+        self.fs = fs
+        self.operations = []
+
+    def create_folder(self, folder_name, path=[]):
+        self.operations.append(["create_folder", folder_name, list(path)])
+
+    def create_file(self, file_name, path=[]):
+        self.operations.append(["create_file", file_name, list(path)])
+
+    def delete_file(self, name, path=[]):
+        self.operations.append(["delete_file", name, list(path)])
+
+    def delete_folder(self, name, path=[]):
+        self.operations.append(["delete_folder", name, list(path)])
+
+    def rename_node(self, old_name, new_name, path=[]):
+        self.operations.append(["rename_node", old_name, new_name, list(path)])
+
+    def move_file(self, file_name, source_path=[], dest_path=[]):
+        self.operations.append(["move_file", file_name, list(source_path), list(dest_path)])
+
+    def move_folder(self, folder_name, source_path=[], dest_path=[]):
+        self.operations.append(["move_folder", folder_name, list(source_path), list(dest_path)])
+
+    def commit(self):
+        operations, self.operations = self.operations, []
+        return self.fs.apply_batch(operations) if operations else []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.operations = []
+
+# The net effect of a batch on every folder it changes, worked out without
+# touching the file system: each operation is checked against the state the
+# ones before it leave, so a conflict is found before anything is applied.
+class _BatchPlan:
+    def __init__(self, fs):
+        self.fs = fs
+        self.now = time.time()
+        self.changes = {}                           # folder -> {name: entry, or None once removed}
+        self.created = []                           # new entries, not in fs.inodes yet
+        self.deleted = []                           # entries removed by delete_*, in order
+        self.names = {}                             # entry -> new name
+        self.parents = {}                           # entry -> new parent folder
+        self.touched = []                           # existing folders renamed, moved or deleted
+        self.folders = {}                           # path tuple -> folder, until a folder is renamed, moved or deleted
+        self.totals = {} if fs._totals is not None else None    # folder -> change of its [files, folders, bytes]
+
+    def child(self, folder, name):
+        changed = self.changes.get(folder)
+        if changed is not None and name in changed:
+            return changed[name]
+        return self.fs._child(folder, name)
+
+    def folder(self, path):
+        key = tuple(path)
+        folder = self.folders.get(key)
+        if folder is None:
+            folder = self.fs.tree.root.vals[0]
+            for name in path:
+                folder = self.child(folder, name)
+                if folder is None or not folder.is_folder:
+                    raise PathNotFoundError(f"Path '{path_str(path)}' does not exist or is not a folder")
+            self.folders[key] = folder
+        return folder
+
+    def put(self, folder, name, node):
+        changed = self.changes.get(folder)
+        if changed is None:
+            changed = self.changes[folder] = {}
+        changed[name] = node
+
+    def count(self, folder, node, sign):
+        # as FileSystem._count, into self.totals
+        if self.totals is None:
+            return
+        if node.is_folder:
+            files, folders, size = FileSystem._contribution(node)
+            change = self.totals.get(node)
+            if change is not None:
+                files, folders, size = files + change[0], folders + change[1], size + change[2]
+        else:
+            files, folders, size = 1, 0, node.size
+        while folder is not None:
+            change = self.totals.get(folder)
+            if change is None:
+                change = self.totals[folder] = [0, 0, 0]
+            change[0] += sign * files
+            change[1] += sign * folders
+            change[2] += sign * size
+            folder = self.parents.get(folder, folder.parent)
+
+    def touch(self, node):
+        if node.is_folder:
+            self.folders.clear()
+            if node.ino is not None:
+                self.touched.append(node)
+
+    def is_ancestor(self, node, folder):
+        while folder is not None:
+            if folder is node:
+                return True
+            folder = self.parents.get(folder, folder.parent)
+        return False
+
+    def create(self, name, path, node_type):
+        parent = self.folder(path)
+        if self.child(parent, name) is not None:
+            what = "A folder or file" if node_type == "folder" else "A file"
+            raise EntryExistsError(f"{what} named '{name}' already exists in '{path_str(path)}'")
+        node = FileSystemNode(sys.intern(name), node_type, parent, None, self.now)
+        self.created.append(node)
+        self.put(parent, name, node)
+        self.count(parent, node, 1)
+
+    def create_folder(self, folder_name, path=[]):
+        self.create(folder_name, path, "folder")
+
+    def create_file(self, file_name, path=[]):
+        self.create(file_name, path, "file")
+
+    def delete(self, name, path, is_folder):
+        parent = self.folder(path)
+        node = self.child(parent, name)
+        if node is None or node.is_folder != is_folder:
+            raise EntryNotFoundError(f"{'Folder' if is_folder else 'File'} '{name}' not found in {path_str(path)}")
+        self.put(parent, name, None)
+        self.count(parent, node, -1)
+        self.deleted.append(node)
+        self.touch(node)
+
+    def delete_file(self, name, path=[]):
+        self.delete(name, path, False)
+
+    def delete_folder(self, name, path=[]):
+        self.delete(name, path, True)
+
+    def rename_node(self, old_name, new_name, path=[]):
+        parent = self.folder(path)
+        if self.child(parent, new_name) is not None:
+            raise EntryExistsError(f"'{new_name}' already exists in {path_str(path)}")
+        node = self.child(parent, old_name)
+        if node is None:
+            raise EntryNotFoundError(f"'{old_name}' not found in {path_str(path)}")
+        self.put(parent, old_name, None)
+        self.put(parent, new_name, node)
+        self.names[node] = new_name
+        self.touch(node)
+
+    def move(self, name, source_path, dest_path, is_folder):
+        source = self.folder(source_path)
+        dest = self.folder(dest_path)
+        node = self.child(source, name)
+        if node is None or node.is_folder != is_folder:
+            raise EntryNotFoundError(f"{'Folder' if is_folder else 'File'} '{name}' not found in {path_str(source_path)}")
+        if self.child(dest, name) is not None:
+            raise EntryExistsError(f"{'Folder ' if is_folder else ''}'{name}' already exists in {path_str(dest_path)}")
+        if is_folder and self.is_ancestor(node, dest):
+            raise InvalidMoveError(f"Cannot move folder '{name}' into its own subtree {path_str(dest_path)}")
+        self.put(source, name, None)
+        self.put(dest, name, node)
+        self.count(source, node, -1)
+        self.count(dest, node, 1)
+        self.parents[node] = dest
+        self.touch(node)
+
+    def move_file(self, file_name, source_path=[], dest_path=[]):
+        self.move(file_name, source_path, dest_path, False)
+
+    def move_folder(self, folder_name, source_path=[], dest_path=[]):
+        self.move(folder_name, source_path, dest_path, True)
+
+# Read-only view of a FileSystem as it was when FileSystem.snapshot() was
+# called, while writers go on with the live tree. Entries come with the name
+# they had then; the FileSystemNode is the live entry, which may have been
+# renamed, moved or deleted since. release() it (or use it in a with block)
+# once done, so the versions only it uses can be freed.
+class Snapshot:
+    def __init__(self, fs):
+        self.fs = fs
+        self.t = fs.t
+        self.roots = {}                             # folder inode id -> B-tree root it had (None if empty), for folders changed since
+        self.root_folder = fs.tree.root.vals[0]
+
+    def _entries(self, folder_node):
+        children = folder_node.children
+        root = children.root if children is not None else None
+        # checked after reading the live root: writers record the old root before replacing it
+        root = self.roots.get(folder_node.ino, root)
+        return FileExplorer(self.t, root) if root is not None else None
+
+    def _folder(self, path):
+        folder_node = self.root_folder
+        for name in path:
+            entries = self._entries(folder_node)
+            node = entries.get(name) if entries is not None else None
+            if node is None or not node.is_folder:
+                raise PathNotFoundError(f"Path '{path_str(path)}' does not exist or is not a folder")
+            folder_node = node
+        return folder_node
+
+    def list_dir(self, path=[], after=None, limit=None, offset=None):
+        # [(name, FileSystemNode), ...], paged like FileSystem.list_dir
+        entries = self._entries(self._folder(path))
+        if entries is None:
+            return []
+        if after is not None:
+            return list(islice(entries.seek(after, exclusive=True), limit))
+        return list(islice(entries.items() if offset is None else entries.seek_index(offset), limit))
+
+    def walk(self, folder_node=None, max_depth=None):
+        # (depth, name, entry), in the order of FileSystem.walk
+        entries = self._entries(self.root_folder if folder_node is None else folder_node)
+        if entries is None or max_depth == 0:
+            return
+        stack = [entries.items()]
+        while stack:
+            for name, node in stack[-1]:
+                depth = len(stack)
+                yield depth, name, node
+                if node.is_folder and (max_depth is None or depth < max_depth):
+                    entries = self._entries(node)
+                    if entries is not None:
+                        stack.append(entries.items())
+                break
+            else:
+                stack.pop()
+
+    def iter_state_lines(self, max_depth=None, folder_node=None, folder_path=""):
+        # below folder_node (whose path is folder_path) if given, else the whole tree
+        parents = [folder_path]
+        for depth, name, node in self.walk(folder_node, max_depth):
+            parent_path = parents[depth - 1]
+            if node.extents is None:
+                yield f"{node.type},{name},{parent_path}\n"
+            else:
+                yield contents_line(node, name, parent_path)
+            if node.is_folder:
+                del parents[depth:]
+                parents.append(f"{parent_path}/{name}" if parent_path else name)
+
+    def export_state(self, out, max_depth=None):
+        write_chunked(out, self.iter_state_lines(max_depth))
+
+    def release(self):
+        self.fs._release_snapshot(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+# Main File System Class
+class FileSystem:
+    # Folders pick their own B-tree degree: t while they fit in one sorted leaf of
+    # 2t - 1 entries, then 4t, 16t, ... up to max_t as they grow, so that small
+    # folders stay a single array and large ones get a wide, shallow tree.
+    # max_t=t keeps every folder at degree t.
+    def __init__(self, t, cache_size=DEFAULT_PATH_CACHE_SIZE, max_t=MAX_FOLDER_DEGREE):
+        self.t = t
+        self.max_t = max(t, max_t)
+        self.path_cache = PathCache(cache_size) if cache_size else None
+        self.pages = None
+        self.blocks = None                          # BlockStore once enable_blocks() was called
+        self.wal = None
+        self.index = None
+        self.scan_workers = None                    # processes of a parallel scan, all the cores if None (1: scan here)
+        self.inodes = {}                            # inode id -> FileSystemNode, for every entry not reclaimed yet
+        self._ino_counter = count(ROOT_INO)         # next() on it is atomic, even between threads
+        self._dropped = []                          # deleted folders and B-tree nodes whose entries are not released yet
+        self._locks = None                          # LockTable once enable_locking() was called
+        self._local = None
+        self.metrics = None                         # Metrics once enable_metrics() was called
+        self._totals = None                         # lock of the folder totals once enable_totals() was called
+        self.clock = VersionClock()
+        self._snapshots = ()                        # open Snapshots; replaced, never changed in place
+        self._snapshot_lock = threading.Lock()
+        self.tree = FileExplorer(t)
+        root_folder = self._new_node("root", "folder", None)
+        self.tree.insert("root", root_folder)
+
+    def _new_node(self, name, node_type, parent, now=None):
+        # names are interned: common ones ("src", "README.md", ...) are stored once
+        node = FileSystemNode(sys.intern(name), node_type, parent, next(self._ino_counter), now)
+        self.inodes[node.ino] = node
+        return node
+
+    @staticmethod
+    def _child(folder_node, name):
+        children = folder_node.children
+        return children.get(name) if children is not None else None
+
+    def _folder_degree(self, n, t=None):
+        # smallest degree of t, 4t, 16t, ... (at most max_t) whose single leaf holds n entries
+        t = t or self.t
+        while (2 * t) - 1 < n and t < self.max_t:
+            t = min(4 * t, self.max_t)
+        return t
+
+    def _insert_child(self, folder_node, node):
+        if self._snapshots:
+            self._preserve(folder_node)
+        children = folder_node.children
+        if children is None:
+            children = folder_node.children = FileExplorer(self.t)
+        elif children.t < self.max_t and len(children.root.keys) == (2 * children.t) - 1:
+            # the root is full: rebuild the folder with a wider degree rather than add a level
+            keys, vals = [], []
+            for name, child in children.items():
+                keys.append(name)
+                vals.append(child)
+            children = folder_node.children = FileExplorer.bulk_load(
+                self._folder_degree(len(keys) + 1, children.t), keys, vals)
+        children.insert(node.name, node)
+
+    def _remove_child(self, folder_node, name):
+        if self._snapshots:
+            self._preserve(folder_node)
+        children = folder_node.children
+        children.delete(children.root, name)
+        if not children.root.keys:                  # empty folders do not keep a tree around
+            folder_node.children = None
+
+    def _drop_subtree(self, node):
+        # node is already unlinked from its parent. Only node itself is released
+        # here; whatever is below it is left to reclaim(), so deleting a huge
+        # folder costs the same as deleting a file.
+        del self.inodes[node.ino]
+        if self.index is not None:
+            self.index.remove(node)
+        node.parent = None                          # its blocks, if any, are given back by the next save
+        if node.children is not None:
+            self._dropped.append(node)
+
+    # Folder totals
+    def enable_totals(self):
+        # Keep [files, folders, bytes] below every folder, brought up to date
+        # along the chain of parents by every change, so that du() and count()
+        # take O(depth) instead of a walk of the subtree.
+        folders = []
+        for node in iter_subtree(self.tree.root.vals[0]):
+            if node.is_folder:
+                node.totals = [0, 0, 0]
+                folders.append(node)
+            else:
+                totals = node.parent.totals
+                totals[0] += 1
+                totals[2] += node.size
+        for folder in reversed(folders):            # every folder after the ones below it
+            parent = folder.parent
+            if parent is not None:
+                totals, below = parent.totals, folder.totals
+                totals[0] += below[0]
+                totals[1] += below[1] + 1
+                totals[2] += below[2]
+        self._totals = threading.Lock()
+
+    @staticmethod
+    def _contribution(node):
+        # (files, folders, bytes) that node adds to the totals of the folders above it
+        if not node.is_folder:
+            return 1, 0, node.size
+        totals = node.totals
+        return (totals[0], totals[1] + 1, totals[2]) if totals is not None else (0, 1, 0)
+
+    def _add_totals(self, folder, files, folders, size):
+        # folder and all its parents; the caller holds self._totals
+        while folder is not None:
+            totals = folder.totals
+            if totals is None:
+                totals = folder.totals = [0, 0, 0]
+            totals[0] += files
+            totals[1] += folders
+            totals[2] += size
+            folder = folder.parent
+
+    def _count(self, folder, node, sign=1, unlink=False):
+        # add node (sign=-1: take it away) to the totals of folder and its parents.
+        # unlink: node is deleted, and changes below it no longer go further up.
+        with self._totals:
+            files, folders, size = self._contribution(node)
+            self._add_totals(folder, sign * files, sign * folders, sign * size)
+            if unlink:
+                node.parent = None
+
+    def _relink(self, node, source_parent, dest_parent):
+        # node moves: its totals leave the chain of source_parent for that of dest_parent
+        if self._totals is None:
+            node.parent = dest_parent
+            return
+        with self._totals:
+            files, folders, size = self._contribution(node)
+            self._add_totals(source_parent, -files, -folders, -size)
+            node.parent = dest_parent
+            self._add_totals(dest_parent, files, folders, size)
+
+    def count(self, path=[]):
+        # (files, folders) below the folder at path
+        node = self.lookup(path)
+        if not node.is_folder:
+            return 0, 0
+        if self._totals is not None:
+            totals = node.totals or (0, 0, 0)
+            return totals[0], totals[1]
+        files = folders = 0
+        for _, entry in self.walk(node):
+            if entry.is_folder:
+                folders += 1
+            else:
+                files += 1
+        return files, folders
+
+    def du(self, path=[]):
+        # bytes of contents below the folder at path (the size of a file)
+        node = self.lookup(path)
+        if not node.is_folder:
+            return node.size
+        if self._totals is not None:
+            return node.totals[2] if node.totals is not None else 0
+        return sum(entry.size for _, entry in self.walk(node) if not entry.is_folder)
+
+    def reclaim(self, budget=None):
+        # Release up to budget entries of deleted folders (all of them if budget
+        # is None), without recursion. Returns True while some are still pending.
+        dropped = self._dropped
+        inodes = self.inodes
+        index = self.index
+        while dropped and (budget is None or budget > 0):
+            x = dropped.pop()
+            if isinstance(x, FileSystemNode):
+                # A deleted folder. Operations that got to it before the delete may
+                # still hold its lock; once they are done nothing can reach it again.
+                lock = self._locks.pop(x) if self._locks is not None else None
+                if lock is not None:
+                    lock.acquire_write()
+                if self._snapshots:                 # a snapshot from before the delete still shows it
+                    self._preserve(x)
+                children, x.children = x.children, None
+                if lock is not None:
+                    lock.release_write()
+                if children is not None:
+                    dropped.append(children.root)
+                continue
+            if isinstance(x, PagedBTreeNode) and not x.loaded():
+                continue                            # never decoded: none of its entries exist yet
+            for node in x.vals:
+                del inodes[node.ino]
+                if index is not None:
+                    index.remove(node)
+                node.parent = None                  # no cycles left, so reference counting frees the entries
+                if node.children is not None:
+                    dropped.append(node)
+            dropped.extend(x.child)
+            if budget is not None:
+                budget -= len(x.vals)
+        return bool(dropped)
+
+    def snapshot(self):
+        # O(1): from now on, changed B-tree nodes are copied instead of
+        # overwritten while this snapshot may still read them.
+        with self._snapshot_lock:
+            self.clock.gen += 1
+            snap = Snapshot(self)
+            self._snapshots += (snap,)
+        return snap
+
+    def _release_snapshot(self, snap):
+        with self._snapshot_lock:
+            self._snapshots = tuple(s for s in self._snapshots if s is not snap)
+
+    def _preserve(self, folder_node):
+        # first change to folder_node since a snapshot: remember the tree the
+        # snapshot has to see, and copy its nodes from now on
+        children = folder_node.children
+        for snap in self._snapshots:
+            if folder_node.ino not in snap.roots:
+                snap.roots[folder_node.ino] = children.root if children is not None else None
+                if children is not None:
+                    children.clock = self.clock
+
+    def _is_live(self, node):
+        # False for entries of a deleted folder that reclaim() has not reached yet
+        while node.parent is not None:
+            node = node.parent
+        return node.ino == ROOT_INO
+
+    def get_node(self, ino):
+        node = self.inodes.get(ino)
+        if node is not None and self._dropped and not self._is_live(node):
+            return None
+        return node
+
+    def _is_ancestor(self, folder_node, node):
+        # O(depth) walk up the parent pointers; node counts as its own ancestor
+        while node is not None:
+            if node is folder_node:
+                return True
+            node = node.parent
+        return False
+
+    def path_of(self, node):
+        # names from root down to node, rebuilt from the parent pointers
+        path = []
+        while node.parent is not None:
+            path.append(node.name)
+            node = node.parent
+        path.reverse()
+        return path
+
+    def _find_node(self, path):
+        current_node = self.tree.root.vals[0]
+        cache = self.path_cache
+        if cache is None or not path:
+            start = 0
+        else:
+            key = tuple(path)
+            node = cache.get(key)
+            if node is not None:
+                return node
+            # only descend below the deepest ancestor that is still cached
+            start = 0
+            for i in range(len(key) - 1, 0, -1):
+                node = cache.peek(key[:i])
+                if node is not None:
+                    current_node, start = node, i
+                    break
+
+        for i in range(start, len(path)):
+            node = self._child(current_node, path[i])
+            if node is None or not node.is_folder:
+                return None
+            current_node = node
+
+        if cache is not None and path:
+            cache.put(key, current_node)
+        return current_node
+
+    def _getParentNode(self, path, write=False):   # write: only used by the locked variant
+        if path:
+            parent_node = self._find_node(path)
+        else:
+            parent_node = self.tree.root.vals[0]
+
+        if not parent_node or not parent_node.is_folder:
+            raise PathNotFoundError(f"Path '{path_str(path)}' does not exist or is not a folder")
+        return parent_node
+
+    def lookup(self, path):
+        # the entry at path, e.g. ["projects", "python", "main.py"]; [] is the root folder
+        if not path:
+            return self.tree.root.vals[0]
+        node = self._child(self._getParentNode(path[:-1]), path[-1])
+        if node is None:
+            raise EntryNotFoundError(f"'{path[-1]}' not found in {path_str(path[:-1])}")
+        return node
+
+    def stat(self, path):
+        node = self.lookup(path)
+        return {
+            "ino": node.ino,
+            "name": node.name,
+            "type": node.type,
+            "parent": node.parent.ino if node.parent is not None else None,
+            "size": node.size,
+            "entries": len(node.children) if node.children is not None else 0,
+            "mtime": node.mtime,
+            "ctime": node.ctime,
+        }
+
+    def _get_parents(self, source_path, dest_path, folder_move=False):
+        return self._getParentNode(source_path, True), self._getParentNode(dest_path, True)
+
+    def list_dir(self, path=[], after=None, limit=None, offset=None):
+        # Entries of the folder at path in name order. Pass the name of the last
+        # entry of a page as after to get the next one, or the position of its
+        # first entry as offset: a page costs O(log n + limit) however large the
+        # folder is.
+        folder_node = self._getParentNode(path)
+        children = folder_node.children
+        if children is None:
+            return []
+        if after is not None:
+            entries = children.seek(after, exclusive=True)
+        else:
+            entries = children.items() if offset is None else children.seek_index(offset)
+        return [node for _, node in islice(entries, limit)]
+
+    def rank(self, name, path=[]):
+        # entries of the folder at path whose names sort before name, in O(log n)
+        children = self._getParentNode(path).children
+        return children.rank(name) if children is not None else 0
+
+    def create_folder(self, folder_name, path=[]):
+        parent_node = self._getParentNode(path, True)
+
+        if self._child(parent_node, folder_name) is not None:
+            raise EntryExistsError(f"A folder or file named '{folder_name}' already exists in '{path_str(path)}'")
+        folder_node = self._new_node(folder_name, "folder", parent_node)
+        self._insert_child(parent_node, folder_node)
+        if self.index is not None:
+            self.index.add(folder_node)
+        if self._totals is not None:
+            self._count(parent_node, folder_node)
+        self._log("create_folder", folder_name, path)
+        return folder_node
+
+    def create_file(self, file_name, path=[]):
+        parent_node = self._getParentNode(path, True)
+
+        if self._child(parent_node, file_name) is not None:
+            raise EntryExistsError(f"A file named '{file_name}' already exists in '{path_str(path)}'")
+
+        file_node = self._new_node(file_name, "file", parent_node)
+        self._insert_child(parent_node, file_node)
+        if self.index is not None:
+            self.index.add(file_node)
+        if self._totals is not None:
+            self._count(parent_node, file_node)
+        self._log("create_file", file_name, path)
+        return file_node
+
+    def delete_file(self, name, path=[]):
+        parent_node = self._getParentNode(path, True)
+
+        node = self._child(parent_node, name)
+        if node is None or node.is_folder:
+            raise EntryNotFoundError(f"File '{name}' not found in {path_str(path)}")
+
+        self._remove_child(parent_node, name)
+        if self._totals is not None:
+            self._count(parent_node, node, -1, unlink=True)
+        self._drop_subtree(node)
+        self._log("delete_file", name, path)
+        return node
+
+    def delete_folder(self, name, path=[]):
+        parent_node = self._getParentNode(path, True)
+
+        target_folder_node = self._child(parent_node, name)
+
+        if target_folder_node is None or not target_folder_node.is_folder:
+            raise EntryNotFoundError(f"Folder '{name}' not found in {path_str(path)}")
+
+        self._remove_child(parent_node, name)
+        if self.path_cache is not None:
+            self.path_cache.invalidate(tuple(path) + (name,))
+        if self._totals is not None:
+            self._count(parent_node, target_folder_node, -1, unlink=True)
+        self._drop_subtree(target_folder_node)
+        self._log("delete_folder", name, path)
+        return target_folder_node
+
+    def rename_node(self, old_name, new_name, path=[]):
+        parent_node = self._getParentNode(path, True)
+
+        if self._child(parent_node, new_name) is not None:
+            raise EntryExistsError(f"'{new_name}' already exists in {path_str(path)}")
+
+        node = self._child(parent_node, old_name)
+        if node is None:
+            raise EntryNotFoundError(f"'{old_name}' not found in {path_str(path)}")
+
+        self._remove_child(parent_node, old_name)
+        node.name = sys.intern(new_name)
+        node.ctime = time.time()
+        self._insert_child(parent_node, node)
+        if self.path_cache is not None and node.is_folder:
+            self.path_cache.invalidate(tuple(path) + (old_name,))
+        if self.index is not None:
+            self.index.remove(node, old_name)
+            self.index.add(node)
+        self._log("rename_node", old_name, new_name, path)
+        return node
+
+    def move_file(self, file_name, source_path=[], dest_path=[]):
+        source_parent, dest_parent = self._get_parents(source_path, dest_path)
+
+        file_node = self._child(source_parent, file_name)
+        if file_node is None or file_node.is_folder:
+            raise EntryNotFoundError(f"File '{file_name}' not found in {path_str(source_path)}")
+
+        if self._child(dest_parent, file_name) is not None:
+            raise EntryExistsError(f"'{file_name}' already exists in {path_str(dest_path)}")
+
+        self._remove_child(source_parent, file_name)
+
+        self._insert_child(dest_parent, file_node)
+        self._relink(file_node, source_parent, dest_parent)
+        file_node.ctime = time.time()
+        self._log("move_file", file_name, source_path, dest_path)
+        return file_node
+
+    def move_folder(self, folder_name, source_path=[], dest_path=[]):
+        source_parent, dest_parent = self._get_parents(source_path, dest_path, folder_move=True)
+
+        folder_node = self._child(source_parent, folder_name)
+        if folder_node is None or not folder_node.is_folder:
+            raise EntryNotFoundError(f"Folder '{folder_name}' not found in {path_str(source_path)}")
+
+        if self._child(dest_parent, folder_name) is not None:
+            raise EntryExistsError(f"Folder '{folder_name}' already exists in {path_str(dest_path)}")
+
+        if self._is_ancestor(folder_node, dest_parent):
+            raise InvalidMoveError(f"Cannot move folder '{folder_name}' into its own subtree {path_str(dest_path)}")
+
+        self._remove_child(source_parent, folder_name)
+
+        self._insert_child(dest_parent, folder_node)
+        self._relink(folder_node, source_parent, dest_parent)
+        folder_node.ctime = time.time()
+        if self.path_cache is not None:
+            self.path_cache.invalidate(tuple(source_path) + (folder_name,))
+        self._log("move_folder", folder_name, source_path, dest_path)
+        return folder_node
+
+    # Batches
+    def transaction(self):
+        # with fs.transaction() as tx: tx.create_file(...); ... -> applied by apply_batch at the end
+        return Transaction(self)
+
+    def apply_batch(self, operations):
+        # Apply [[op, *args], ...] (create_*, delete_*, rename_node, move_*, with
+        # the arguments of those methods) all together, or raise the error of the
+        # first one that cannot be applied and change nothing. The changes are
+        # grouped by folder and each folder's tree is changed once; returns the
+        # entries created.
+        plan = _BatchPlan(self)
+        for number, (op, *args) in enumerate(operations, 1):
+            if op not in BATCH_OPERATIONS:
+                raise ValueError(f"Operation {number}: '{op}' cannot be part of a batch")
+            try:
+                getattr(plan, op)(*args)
+            except FileSystemError as e:
+                raise type(e)(f"Operation {number} ({op}): {e}") from None
+
+        stale = [tuple(self.path_of(node)) for node in plan.touched] if self.path_cache is not None else ()
+        for node in plan.created:                  # given an inode first: snapshots know folders by it
+            node.ino = next(self._ino_counter)
+            self.inodes[node.ino] = node
+        renamed = []
+        for node, name in plan.names.items():
+            renamed.append((node, node.name))
+            node.name = sys.intern(name)
+            node.ctime = plan.now
+        for node, parent in plan.parents.items():
+            node.parent = parent
+            node.ctime = plan.now
+        for folder_node, changed in plan.changes.items():
+            self._merge_children(folder_node, changed)
+        if self.index is not None:
+            created = set(plan.created)
+            for node, old_name in renamed:
+                if node not in created:
+                    self.index.remove(node, old_name)
+                    self.index.add(node)
+            for node in plan.created:
+                self.index.add(node)
+        if plan.totals:
+            with self._totals:
+                for folder_node, (files, folders, size) in plan.totals.items():
+                    totals = folder_node.totals
+                    if totals is None:
+                        totals = folder_node.totals = [0, 0, 0]
+                    totals[0] += files
+                    totals[1] += folders
+                    totals[2] += size
+        for node in plan.deleted:
+            self._drop_subtree(node)
+        for path in stale:
+            self.path_cache.invalidate(path)
+        self._log("apply_batch", operations)
+        return plan.created
+
+    def _merge_children(self, folder_node, changed):
+        # changed: name -> entry, or None to remove it. A few changes go in one
+        # by one, in name order; once they are a sizeable share of the folder,
+        # they are merged with its entries in one pass and the tree is rebuilt.
+        children = folder_node.children
+        if children is not None:
+            if len(changed) * BATCH_REBUILD_RATIO < len(children):
+                for name in sorted(changed):
+                    node = changed[name]
+                    current = self._child(folder_node, name)
+                    if current is node:
+                        continue
+                    if current is not None:
+                        self._remove_child(folder_node, name)
+                    if node is not None:
+                        self._insert_child(folder_node, node)
+                return
+
+        if self._snapshots:
+            self._preserve(folder_node)
+        keys, vals = children.flatten() if children is not None else ([], [])
+        gone = []
+        for name in changed:
+            i = bisect_left(keys, name)
+            if i < len(keys) and keys[i] == name:
+                gone.append(i)
+        if gone:
+            gone.sort()
+            kept_keys, kept_vals = [], []
+            start = 0
+            for i in gone:
+                kept_keys += keys[start: i]
+                kept_vals += vals[start: i]
+                start = i + 1
+            keys = kept_keys + keys[start:]
+            vals = kept_vals + vals[start:]
+        for name, node in changed.items():
+            if node is not None:
+                keys.append(name)
+                vals.append(node)
+        order = sorted(range(len(keys)), key=keys.__getitem__)     # the kept keys are one sorted run already
+        keys = [keys[i] for i in order]
+        vals = [vals[i] for i in order]
+        folder_node.children = FileExplorer.bulk_load(self._folder_degree(len(keys)), keys, vals) if keys else None
+
+    # File contents
+    def enable_blocks(self, filename='Data_set.blocks'):
+        # Keep file contents in a block store (btfs_blocks). The extents of the
+        # files are part of the saved state, so the free space is rebuilt from them.
+        self.blocks = BlockStore(filename)
+        # a page file only has the entries faulted in so far in the inode table, so its tree is walked instead
+        nodes = self.inodes.values() if self.pages is None else (node for _, node in self.walk())
+        self.blocks.load(extent for node in nodes if node.extents for extent in node.extents)
+
+    def _file_node(self, name, path, write=False):
+        node = self._child(self._getParentNode(path, write), name)
+        if node is None or node.is_folder:
+            raise EntryNotFoundError(f"File '{name}' not found in {path_str(path)}")
+        return node
+
+    @contextmanager
+    def _save_snapshot(self):
+        # Snapshot to save the state from. The contents its files point to are
+        # on disk before it is written, and once it is, the blocks it no longer
+        # points to are given back.
+        mark = self.blocks.mark() if self.blocks is not None else None
+        with self.snapshot() as snap:
+            if mark is not None and self.wal is None:
+                self.blocks.sync()
+            yield snap
+            if mark is not None:
+                self._commit_blocks((node for _, _, node in snap.walk()), mark)
+
+    def _commit_blocks(self, entries, mark):
+        # entries: every entry of a state now saved, from a snapshot taken after mark
+        self.blocks.commit((extent for node in entries if node.extents for extent in node.extents), mark)
+
+    def _set_contents(self, node, size, extents, mtime):
+        # The last save may still point to the old blocks, with or without the
+        # log: they are only given back once a newer save is on disk (see _save_snapshot).
+        if self._totals is not None and size != node.size:
+            with self._totals:
+                self._add_totals(node.parent, 0, 0, size - node.size)
+        node.size = size
+        node.extents = extents
+        node.mtime = mtime
+
+    def write_file(self, name, data, path=[]):
+        # Replace the contents of an existing file with data (bytes, bytearray,
+        # memoryview, ...). The new blocks are written before the file points
+        # to them, so a crash leaves either the old or the new contents.
+        if self.blocks is None:
+            raise ValueError("no block store: call enable_blocks() first")
+        node = self._file_node(name, path, True)
+        extents = self.blocks.write(data)
+        if self.wal is not None:
+            self.blocks.sync()                      # the blocks must be on disk before the log record pointing to them
+        size = memoryview(data).nbytes
+        mtime = time.time()
+        self._set_contents(node, size, extents, mtime)
+        self._log("attach_extents", name, path, size, extents, mtime)
+        return node
+
+    def attach_extents(self, name, path, size, extents, mtime):
+        # the metadata half of write_file, replayed from the write-ahead log
+        node = self._file_node(name, path, True)
+        self._set_contents(node, size, [tuple(extent) for extent in extents], mtime)
+        self._log("attach_extents", name, path, size, extents, mtime)
+        return node
+
+    def read_file(self, name, path=[]):
+        # -> memoryview of the contents, read straight into a new buffer
+        node = self._file_node(name, path)
+        if not node.extents:
+            return memoryview(b"")
+        if self.blocks is None:
+            raise ValueError("no block store: call enable_blocks() first")
+        try:
+            return self.blocks.read(node.extents, node.size)
+        except EOFError as e:
+            raise ContentsLostError(f"Contents of '{name}' in {path_str(path)} are missing: {e}") from None
+
+    def walk(self, folder_node=None, max_depth=None):
+        # (depth, entry) for everything below folder_node (the root folder by
+        # default): each folder in name order, directly followed by its own
+        # entries, which are at depth + 1. Only one B-tree iterator per open
+        # folder is kept, so memory grows with the depth, not with the size.
+        if folder_node is None:
+            folder_node = self.tree.root.vals[0]
+        if folder_node.children is None or max_depth == 0:
+            return
+        stack = [folder_node.children.items()]
+        while stack:
+            for _, node in stack[-1]:
+                depth = len(stack)
+                yield depth, node
+                if node.children is not None and (max_depth is None or depth < max_depth):
+                    stack.append(node.children.items())
+                break
+            else:
+                stack.pop()
+
+    def tree_lines(self, max_depth=None):
+        # the lines of the tree view, one entry per line, produced lazily
+        root_node = self.tree.root.vals[0]
+        yield "root/"
+        if not root_node.children:
+            yield "  (Root folder is empty)"
+            return
+        for depth, node in self.walk(root_node, max_depth):
+            yield f"{'    ' * depth}{node.name} ({node.type})"
+
+    def write_tree(self, out, max_depth=None):
+        write_chunked(out, (line + "\n" for line in self.tree_lines(max_depth)))
+
+    def enable_index(self, trigrams=False):
+        # trigrams: also index the trigrams of every name, for search_substring and search_fuzzy
+        self.index = (NameIndex if self._locks is None else SynchronizedNameIndex)(self.t, trigrams)
+        root_node = self.tree.root.vals[0]
+        for node in iter_subtree(root_node):
+            if node is not root_node:
+                self.index.add(node)
+
+    def _search(self, matches, index_query, target_type):
+        # [(FileSystemNode, ["root", ..., name]), ...]
+        if self.index is not None:
+            dropped = bool(self._dropped)
+            return sorted(((fsnode, ["root", *self.path_of(fsnode)]) for fsnode in index_query()
+                           if fsnode.type == target_type and (not dropped or self._is_live(fsnode))),
+                          key=lambda result: result[1])
+        if len(self.inodes) >= PARALLEL_SCAN_MIN_ENTRIES:
+            return self._parallel_scan(matches, target_type)
+        results = []
+        path = ["root"]
+        for depth, fsnode in self.walk():
+            del path[depth:]
+            path.append(fsnode.name)
+            if fsnode.type == target_type and matches(fsnode.name):
+                results.append((fsnode, list(path)))
+        return results
+
+    def _parallel_scan(self, matches, target_type):
+        global _scan_source
+        workers = self.scan_workers or os.cpu_count() or 1
+        folders = target_type == "folder"
+        results = []
+        level = [([], self.tree.root.vals[0])]
+        for _ in range(SCAN_SPLIT_DEPTH):
+            below = []
+            for path, folder_node in level:
+                if folder_node.children is None:
+                    continue
+                for name, node in folder_node.children.items():
+                    entry_path = path + [name]
+                    if node.is_folder == folders and matches(name):
+                        results.append((node, ["root", *entry_path]))
+                    if node.children is not None:
+                        below.append((entry_path, node))
+            level = below
+            if len(level) >= workers * SCAN_JOBS_PER_WORKER:
+                break
+
+        count = min(len(level), workers * SCAN_JOBS_PER_WORKER)
+        with _scan_lock:
+            _scan_source = (self, matches, folders, [level[i::count] for i in range(count)])
+            try:
+                found = shard_map(_scan_segment, [(i,) for i in range(count)], workers)
+            finally:
+                _scan_source = None
+        root_node = self.tree.root.vals[0]
+        for paths in found:
+            for path in paths:
+                node = root_node
+                for name in path:
+                    node = self._child(node, name)
+                results.append((node, ["root", *path]))
+        results.sort(key=lambda result: result[1])
+        return results
+
+    def search_file(self, file_name):
+        return self._search(lambda key: key == file_name, lambda: self.index.lookup(file_name), "file")
+
+    def search_folder(self, folder_name):
+        return self._search(lambda key: key == folder_name, lambda: self.index.lookup(folder_name), "folder")
+
+    def search_prefix(self, prefix, target_type="file"):
+        return self._search(lambda key: key.startswith(prefix), lambda: self.index.prefix(prefix), target_type)
+
+    def search_glob(self, pattern, target_type="file"):
+        return self._search(lambda key: fnmatchcase(key, pattern), lambda: self.index.glob(pattern), target_type)
+
+    def search_pattern(self, pattern):
+        return self.search_glob(pattern, "folder") + self.search_glob(pattern, "file")
+
+    def search_substring(self, fragment, target_type="file", ignore_case=False):
+        # entries whose name contains fragment
+        if ignore_case:
+            key = fragment.lower()
+            matches = lambda name: key in name.lower()
+        else:
+            matches = lambda name: fragment in name
+        return self._search(matches, lambda: self.index.substring(fragment, ignore_case), target_type)
+
+    def search_fuzzy(self, name, max_distance=2, target_type="file", ignore_case=False):
+        # entries whose name is at most max_distance single-character edits away from name
+        if ignore_case:
+            key = name.lower()
+            matches = lambda candidate: edit_distance(key, candidate.lower(), max_distance) <= max_distance
+        else:
+            matches = lambda candidate: edit_distance(name, candidate, max_distance) <= max_distance
+        return self._search(matches, lambda: self.index.fuzzy(name, max_distance, ignore_case), target_type)
+
+    def iter_state_lines(self, max_depth=None):
+        # save_state lines ("type,name,parent/path"), parents before their entries
+        parents = [""]                              # parents[d]: path of the open folder at depth d
+        for depth, node in self.walk(max_depth=max_depth):
+            parent_path = parents[depth - 1]
+            if node.extents is None:
+                yield f"{node.type},{node.name},{parent_path}\n"
+            else:
+                yield contents_line(node, node.name, parent_path)
+            if node.children is not None:
+                del parents[depth:]
+                parents.append(f"{parent_path}/{node.name}" if parent_path else node.name)
+
+    def _state_lines(self):
+        return list(self.iter_state_lines())
+
+    def export_state(self, out, max_depth=None):
+        # stream the save_state format to an open text file, nothing is collected
+        # in memory; writers are not held up, the export shows the tree as it was
+        with self.snapshot() as snap:
+            snap.export_state(out, max_depth)
+
+    @staticmethod
+    def _write_state(filename, lines, lsn=None):
+        # write next to the old state and swap it in, so a crash never leaves a half-written file
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'w') as f:
+            if lsn is not None:
+                f.write(f"#lsn,{lsn}\n")             # load_state skips this line: it only has two fields
+            write_chunked(f, lines)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filename, filename)
+        fsync_dir(filename)
+
+    @staticmethod
+    def _write_shards(filename, snap, lsn=0, workers=None):
+        global _shard_source
+        previous = read_manifest(filename) if os.path.exists(filename) and is_manifest(filename) else None
+        generation = previous["generation"] + 1 if previous is not None else 1
+        directory = os.path.dirname(filename)
+        tops = [(name, node) for name, node in snap.list_dir() if node.is_folder]
+        count = min(len(tops), SHARD_SEGMENTS)
+        segments = [tops[i::count] for i in range(count)]
+        names = [f"{os.path.basename(filename)}.{generation}.{i:04d}" for i in range(count + 1)]
+        with _shard_lock:
+            _shard_source = (snap, segments)
+            try:
+                counts = shard_map(_write_segment, [(i, os.path.join(directory, name))
+                                                    for i, name in enumerate(names)], workers)
+            finally:
+                _shard_source = None
+
+        manifest = {
+            "format": SHARD_FORMAT,
+            "version": SHARD_VERSION,
+            "t": snap.t,
+            "generation": generation,
+            "lsn": lsn,
+            "segments": [{"file": segment_file, "entries": entries, "folders": [name for name, _ in folders]}
+                         for segment_file, entries, folders in zip(names, counts, [[]] + segments)],
+        }
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'w') as f:
+            json.dump(manifest, f, indent=1)
+            f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filename, filename)
+        fsync_dir(filename)
+        if previous is not None:
+            for segment in previous["segments"]:
+                try:
+                    os.remove(os.path.join(directory, segment["file"]))
+                except FileNotFoundError:
+                    pass
+
+    @staticmethod
+    def _write_compact(filename, snap, codec="zlib", lsn=0):
+        compress = COMPACT_CODECS[codec][0]
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            f.write(b"%s %d %s %d\n" % (COMPACT_MAGIC, COMPACT_VERSION, codec.encode(), lsn))
+
+            def flush(lines):
+                data = compress(b"".join(lines))
+                f.write(BLOCK_HEADER.pack(len(data)))
+                f.write(data)
+
+            lines, size = [], 0                     # encoded records of the block and their size in bytes
+            for line in iter_compact_lines(snap):
+                data = line.encode('utf-8')
+                if size + len(data) > COMPACT_BLOCK and lines:
+                    flush(lines)
+                    lines, size = [], 0
+                lines.append(data)
+                size += len(data)
+            if lines:
+                flush(lines)
+            f.write(BLOCK_HEADER.pack(0))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filename, filename)
+        fsync_dir(filename)
+
+    def _write_checkpoint(self, filename, snap, lsn):
+        if self.checkpoint_shards:
+            self._write_shards(filename, snap, lsn)
+        elif self.checkpoint_compact is not None:
+            self._write_compact(filename, snap, self.checkpoint_compact, lsn)
+        else:
+            self._write_state(filename, snap.iter_state_lines(), lsn)
+
+    @staticmethod
+    def _checkpoint_lsn(filename):
+        with open(filename, 'rb') as f:             # compact snapshots are binary after their first line
+            first = f.readline()
+        if first.startswith(COMPACT_MAGIC):
+            return int(first.split()[3])
+        if first.startswith(b"{"):
+            return read_manifest(filename)["lsn"]
+        return int(first.split(b',')[1]) if first.startswith(b"#lsn,") else 0
+
+    def save_state(self, filename='Data_set.txt'):
+
+        if self.wal is not None and filename == self.checkpoint_file:
+            self.checkpoint(wait=True)
+        else:
+            with self._save_snapshot() as snap:
+                self._write_state(filename, snap.iter_state_lines())
+            remove_segments(filename)               # a log left next to this file belongs to an older state
+
+    def save_shards(self, filename='Data_set.shards', workers=None):
+        # the save_state lines split by top-level folder, written in parallel (see SHARD_FORMAT)
+        if self.wal is not None and filename == self.checkpoint_file and self.checkpoint_shards:
+            self.checkpoint(wait=True)
+            return
+        with self._save_snapshot() as snap:
+            self._write_shards(filename, snap, workers=workers)
+        remove_segments(filename)
+
+    def save_compact(self, filename='Data_set.btz', codec="zlib"):
+        # the tree as a compact snapshot (see COMPACT_MAGIC), written as it is walked
+        if codec not in COMPACT_CODECS:
+            raise ValueError(f"Unknown codec '{codec}', use one of {', '.join(COMPACT_CODECS)}")
+        if self.wal is not None and filename == self.checkpoint_file and self.checkpoint_compact == codec:
+            self.checkpoint(wait=True)
+            return
+        with self._save_snapshot() as snap:
+            self._write_compact(filename, snap, codec)
+        remove_segments(filename)
+
+    # Write-ahead logging
+    def enable_wal(self, filename='Data_set.txt', checkpoint_interval=60.0, checkpoint_records=10000,
+                   checkpoint=True, start_lsn=0, shards=False, compact=None, **wal_options):
+        # From now on every mutation is appended to '<filename>.wal.*' before it is
+        # acknowledged, and the state in 'filename' is refreshed by background
+        # checkpoints, each a full dump of a snapshot (sharded if shards, a compact
+        # snapshot with the codec compact if given), not only of what changed.
+        if compact is not None and compact not in COMPACT_CODECS:
+            raise ValueError(f"Unknown codec '{compact}', use one of {', '.join(COMPACT_CODECS)}")
+        self.checkpoint_file = filename
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_records = checkpoint_records
+        self.checkpoint_shards = shards
+        self.checkpoint_compact = compact
+        self._checkpoint_thread = None
+        if checkpoint:
+            with self.snapshot() as snap:
+                self._write_checkpoint(filename, snap, start_lsn)
+            remove_segments(filename)
+        self.wal = WriteAheadLog(filename, start_lsn, **wal_options)
+        self._last_checkpoint = (time.monotonic(), start_lsn)
+
+    def _log(self, op, *args):
+        if self._dropped:
+            self.reclaim(RECLAIM_BATCH)             # every mutation pays for a slice of the earlier folder deletes
+        if self.wal is None:
+            return
+        self._commit(self.wal.append(op, *args))
+
+    def _commit(self, lsn):
+        if self.wal.sync_commit:
+            self.wal.wait(lsn)
+
+        started, checkpoint_lsn = self._last_checkpoint
+        if (lsn - checkpoint_lsn >= self.checkpoint_records
+                or time.monotonic() - started >= self.checkpoint_interval):
+            self.checkpoint()
+
+    def checkpoint(self, wait=False):
+        running = self._checkpoint_thread
+        if running is not None and running.is_alive():
+            if not wait:
+                return
+            running.join()
+
+        # Taking a snapshot is the only part done on the caller's thread; the
+        # WAL switches to a new segment at the same point, so everything in the
+        # older segments is covered by this checkpoint once it is on disk.
+        mark = self.blocks.mark() if self.blocks is not None else None
+        snap = self.snapshot()
+        lsn, seq = self.wal.rotate()
+        self._last_checkpoint = (time.monotonic(), lsn)
+        filename = self.checkpoint_file
+
+        def write():
+            # contents need no sync here: write_file syncs them before logging
+            try:
+                self._write_checkpoint(filename, snap, lsn)
+                remove_segments(filename, before_seq=seq)
+                if mark is not None:
+                    self._commit_blocks((node for _, _, node in snap.walk()), mark)
+            finally:
+                snap.release()
+
+        if wait:
+            write()
+        else:
+            self._checkpoint_thread = threading.Thread(target=write, name="checkpoint", daemon=True)
+            self._checkpoint_thread.start()
+
+    def close(self):
+        if self.wal is not None:
+            self.checkpoint(wait=True)
+            self.wal.close()
+            self.wal = None
+        if self.blocks is not None:
+            self.blocks.close()
+            self.blocks = None
+
+    # Metrics
+    def enable_metrics(self, metrics=None):
+        # Count the B-tree work and time of every operation (see btfs_metrics).
+        # -> the Metrics they are recorded in, which several file systems may share.
+        if self.metrics is None:
+            self.metrics = metrics if metrics is not None else Metrics()
+            _use_probes(1)
+            self._meter_operations()
+        return self.metrics
+
+    def disable_metrics(self):
+        # -> the Metrics recorded so far; the operations and B-tree are plain again
+        metrics = self.metrics
+        if metrics is None:
+            return None
+        for name in METERED_OPERATIONS:
+            method = self.__dict__.get(name)
+            if getattr(method, "metered", False):
+                inner = method.__wrapped__
+                if getattr(inner, "__self__", None) is self:
+                    delattr(self, name)             # the class method
+                else:
+                    setattr(self, name, inner)      # the locked variant
+        self.metrics = None
+        _use_probes(-1)
+        return metrics
+
+    def _meter_operations(self):
+        for name in METERED_OPERATIONS:
+            method = getattr(self, name)
+            if not getattr(method, "metered", False):
+                setattr(self, name, self._metered(method, name))
+
+    def _metered(self, method, name):
+        metrics = self.metrics
+
+        @functools.wraps(method)
+        def metered(*args, **kwargs):
+            if getattr(_op_counters, "counts", None) is not None:
+                return method(*args, **kwargs)      # called from another operation, which it counts towards
+            counts = _op_counters.counts = [0] * len(COUNTERS)
+            failed = True
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = time.perf_counter() - start
+                _op_counters.counts = None
+                metrics.record(name, counts, elapsed, failed)
+
+        metered.metered = True
+        return metered
+
+    def folder_shapes(self, min_entries=0):
+        # (path, tree_shape) of every folder with at least min_entries entries
+        for node in iter_subtree(self.tree.root.vals[0]):
+            if node.children is not None:
+                shape = tree_shape(node.children)
+                if shape["entries"] >= min_entries:
+                    yield self.path_of(node), shape
+
+    def dump_metrics(self, filename=None, min_entries=FOLDER_METRICS_MIN_ENTRIES):
+        # Operation metrics and tree shapes as JSON: a summary over every folder
+        # and the shape of each folder with at least min_entries entries.
+        dump = self.metrics.dump() if self.metrics is not None else {"operations": {}}
+        folders, heights = [], {}
+        total = {"folders": 0, "entries": 0, "nodes": 0, "key_slots": 0}
+        for path, shape in self.folder_shapes():
+            total["folders"] += 1
+            total["entries"] += shape["entries"]
+            total["nodes"] += shape["nodes"]
+            total["key_slots"] += shape["nodes"] * ((2 * shape["degree"]) - 1)
+            heights[shape["height"]] = heights.get(shape["height"], 0) + 1
+            if shape["entries"] >= min_entries:
+                folders.append({"path": "/".join(path), **shape})
+        dump["trees"] = {"t": self.t, "max_t": self.max_t, **total,
+                         "fill": total["entries"] / total["key_slots"] if total["key_slots"] else 0.0,
+                         "folders_by_height": dict(sorted(heights.items()))}
+        dump["folders"] = sorted(folders, key=lambda folder: -folder["entries"])
+        if filename is not None:
+            with open(filename, 'w', encoding='utf-8') as f:
+                json.dump(dump, f, indent=1)
+        return dump
+
+    # Concurrent mode
+    def enable_locking(self):
+        # Make this file system safe to share between threads (see btfs_locks).
+        # The locked variants are bound on this instance only, so file systems
+        # that never call this pay nothing for it.
+        self._locks = LockTable()
+        self._local = threading.local()
+        self.path_cache = None                      # a cached folder would skip the lock coupling
+        if self.index is not None:
+            index = SynchronizedNameIndex(self.t)
+            index.by_name, index.names, index.grams = self.index.by_name, self.index.names, self.index.grams
+            self.index = index
+        self._getParentNode = self._lock_folder
+        self._get_parents = self._lock_two_folders
+        self._log = self._log_deferred
+        for name, exclusive in LOCKED_OPERATIONS.items():
+            setattr(self, name, self._locked(getattr(type(self), name), exclusive))
+        if self.metrics is not None:
+            self._meter_operations()                # time the locked variants, waiting included
+
+    def _locked(self, method, exclusive):
+        local = self._local
+        tree = self._locks.tree
+
+        @functools.wraps(method)
+        def locked(*args, **kwargs):
+            if getattr(local, "op", None) is not None:
+                return method(self, *args, **kwargs)    # called from another operation, which holds the locks
+            alone = exclusive if exclusive.__class__ is bool else getattr(self, exclusive) is None
+            if alone:
+                tree.acquire_write()
+            else:
+                tree.acquire_read()
+            op = local.op = _Operation()
+            try:
+                result = method(self, *args, **kwargs)
+            finally:
+                local.op = None
+                op.release()
+                if alone:
+                    tree.release_write()
+                else:
+                    tree.release_read()
+            # the slow parts run with no lock held: the fsync is shared with other threads
+            if op.lsn is not None:
+                self._commit(op.lsn)
+            if self._dropped:
+                self.reclaim(RECLAIM_BATCH)
+            return result
+
+        return locked
+
+    def _lock_folder(self, path, write=False):
+        # Lock coupling from the root down to path: a folder is locked before its
+        # parent is released. The folder itself stays locked (for writing if
+        # write) until the operation returns.
+        locks = self._locks
+        node = self.tree.root.vals[0]
+        lock = locks.get(node)
+        if write and not path:
+            lock.acquire_write()
+        else:
+            lock.acquire_read()
+        for i, name in enumerate(path, 1):
+            child = self._child(node, name)
+            if child is None or not child.is_folder:
+                lock.release_read()
+                raise PathNotFoundError(f"Path '{path_str(path)}' does not exist or is not a folder")
+            child_lock = locks.get(child)
+            if write and i == len(path):
+                child_lock.acquire_write()
+            else:
+                child_lock.acquire_read()
+            lock.release_read()
+            node, lock = child, child_lock
+        self._local.op.held.append(lock.release_write if write else lock.release_read)
+        if not self._is_live(node):                 # an ancestor was deleted while we were on the way down
+            raise PathNotFoundError(f"Path '{path_str(path)}' does not exist or is not a folder")
+        return node
+
+    def _lock_order(self, folder_node):
+        # shallower folders first, like lock coupling does; ties broken by inode id
+        depth = 0
+        node = folder_node
+        while node.parent is not None:
+            node = node.parent
+            depth += 1
+        return depth, folder_node.ino
+
+    def _lock_two_folders(self, source_path, dest_path, folder_move=False):
+        # Both parents of a move are write-locked in _lock_order, so two moves
+        # can never wait for each other. Moving a folder to another parent also
+        # takes the rename lock: two such moves could otherwise create a cycle.
+        op = self._local.op
+        locks = self._locks
+        if folder_move and list(source_path) != list(dest_path):
+            locks.rename.acquire()
+            op.held.append(locks.rename.release)
+        for _ in range(LOCK_RETRIES):
+            # find both folders first; one lookup must not hold a lock while the other starts at the root
+            source = self._lock_folder(source_path)
+            op.held.pop()()
+            dest = self._lock_folder(dest_path)
+            op.held.pop()()
+            folders = [source] if source is dest else sorted((source, dest), key=self._lock_order)
+            for folder_node in folders:
+                lock = locks.get(folder_node)
+                lock.acquire_write()
+                op.held.append(lock.release_write)
+            # the folders may have been moved or deleted while nothing was locked
+            if all(self._is_live(folder_node) and self.path_of(folder_node) == list(path)
+                   for folder_node, path in ((source, source_path), (dest, dest_path))):
+                return source, dest
+            for _ in folders:
+                op.held.pop()()
+        raise PathNotFoundError(f"Paths '{path_str(source_path)}' and '{path_str(dest_path)}' kept changing")
+
+    def _log_deferred(self, op, *args):
+        # Concurrent mode: the record is appended while the folder is still
+        # locked, so the log has the changes in the order they were applied.
+        if self.wal is not None:
+            self._local.op.lsn = self.wal.append(op, *args)
+
+    @staticmethod
+    def recover(filename='Data_set.txt', t_value=6, max_t=MAX_FOLDER_DEGREE, **wal_options):
+        # Load the last checkpoint, replay the log written after it and keep logging.
+        fs = FileSystem.load_state(filename, t_value, max_t=max_t)
+        if fs is None:
+            fs = FileSystem(t_value, max_t=max_t)
+            fs.enable_wal(filename, **wal_options)
+            return fs
+
+        lsn = FileSystem._checkpoint_lsn(filename)
+        replayed = 0
+        for record in read_records(filename, lsn):
+            if record["op"] in WAL_OPERATIONS:
+                try:
+                    getattr(fs, record["op"])(*record["args"])
+                except FileSystemError as e:
+                    log.warning("Skipping logged operation %d: %s", record["lsn"], e)
+            lsn = record["lsn"]
+            replayed += 1
+        if replayed:
+            log.info("Replayed %d logged operations from '%s'", replayed, filename)
+
+        fs.enable_wal(filename, checkpoint=False, start_lsn=lsn, **wal_options)
+        return fs
+
+    def _bulk_build(self, groups):
+        # groups: parent_path -> {name: type}, in the order the entries were read
+        folders = {"": self.tree.root.vals[0]}
+        pending = [""]
+        now = time.time()                           # one timestamp shared by every entry without contents
+        while pending:
+            parent_path = pending.pop()
+            parent_node = folders.pop(parent_path)
+            entries = groups.pop(parent_path, None)
+            if not entries:
+                continue
+
+            nodes = []
+            for name in sorted(entries):
+                entry = entries[name]
+                if entry.__class__ is str:
+                    node = self._new_node(name, entry, parent_node, now)
+                else:                               # a file with contents: all the fields of its line
+                    node = self._new_node(name, "file", parent_node, now)
+                    load_contents(node, entry)
+                nodes.append(node)
+                if node.is_folder:
+                    path = f"{parent_path}/{name}" if parent_path else name
+                    folders[path] = node
+                    pending.append(path)
+            parent_node.children = FileExplorer.bulk_load(self._folder_degree(len(nodes)),
+                                                          [node.name for node in nodes], nodes)
+
+        for parent_path in groups:
+            log.warning("Skipping entries of '%s': path does not exist or is not a folder", parent_path or 'root')
+
+    def save_pages(self, filename='Data_set.btfs'):
+        page_size = PAGE_SIZE
+
+        def pages(x):
+            # consecutive pages x takes up, known before it is written
+            size = NODE_HEADER.size + len(x.keys) * ENTRY_HEADER.size + (0 if x.leaf else len(x.child) * 8)
+            for name, node in zip(x.keys, x.vals):
+                size += len(name.encode('utf-8'))
+                if node.extents is not None:
+                    size += CONTENTS_HEADER.size + 16 * len(node.extents)
+            return -(-size // page_size)
+
+        if self.blocks is not None:
+            self.blocks.sync()                      # saved from the live tree, which nothing changes meanwhile
+            mark = self.blocks.mark()
+
+        # Pages are numbered in the order they are queued, so writing the
+        # queue front to back lays them out sequentially.
+        root_fs_node = self.tree.root.vals[0]
+        root_tree = root_fs_node.children if root_fs_node.children is not None else FileExplorer(self.t)
+        queue = deque([root_tree.root])
+        next_page = 1 + pages(root_tree.root)
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            f.write(bytes(page_size))
+            while queue:
+                x = queue.popleft()
+                page = bytearray(NODE_HEADER.pack(x.leaf, len(x.keys)))
+                for name, node in zip(x.keys, x.vals):
+                    data = name.encode('utf-8')
+                    if len(data) > MAX_NAME_BYTES:
+                        raise ValueError(f"Name '{name}' is longer than {MAX_NAME_BYTES} bytes")
+                    degree = child_page = size = 0
+                    if node.children is not None and (node.children.root.keys or not node.children.root.leaf):
+                        degree = node.children.t
+                        child_page = next_page
+                        size = len(node.children)
+                        next_page += pages(node.children.root)
+                        queue.append(node.children.root)
+                    flags = (ENTRY_FOLDER if node.is_folder else 0) | (ENTRY_CONTENTS if node.extents is not None else 0)
+                    page += ENTRY_HEADER.pack(flags, degree, child_page, size, len(data))
+                    page += data
+                    if node.extents is not None:
+                        page += CONTENTS_HEADER.pack(node.size, node.mtime, node.ctime, len(node.extents))
+                        page += struct.pack(f"<{2 * len(node.extents)}Q", *[n for extent in node.extents for n in extent])
+                if not x.leaf:
+                    child_pages = []
+                    for y in x.child:
+                        child_pages.append(next_page)
+                        next_page += pages(y)
+                    page += struct.pack(f"<{2 * len(x.child)}I", *child_pages, *[y.size for y in x.child])
+                    queue.extend(x.child)
+                f.write(page.ljust(-(-len(page) // page_size) * page_size, b"\0"))
+
+            f.seek(0)
+            f.write(PAGE_HEADER.pack(PAGE_MAGIC, PAGE_VERSION, page_size, self.t, next_page, 1, root_tree.t,
+                                 len(root_tree)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filename, filename)
+        if self.blocks is not None:
+            self._commit_blocks((node for _, node in self.walk()), mark)
+
+    @staticmethod
+    def load_pages(filename='Data_set.btfs', max_t=MAX_FOLDER_DEGREE):
+        # Only the header is read here: B-tree nodes are decoded from the
+        # mapping the first time a lookup descends into them.
+        if not os.path.exists(filename):
+            return None
+
+        with open(filename, 'rb') as f:
+            t = PAGE_HEADER.unpack(f.read(PAGE_HEADER.size))[3]
+        fs = FileSystem(t, max_t=max_t)
+        fs.pages = PageFile(filename, fs)
+        root_fs_node = fs.tree.root.vals[0]
+        pages = fs.pages
+        root_fs_node.children = FileExplorer(pages.root_degree, pages.node(pages.root_page, root_fs_node, pages.root_size))
+        return fs
+
+    @staticmethod
+    def load_shards(filename='Data_set.shards', t_value=None, workers=None, max_t=MAX_FOLDER_DEGREE):
+        # Segments are parsed in parallel, then grafted under the root folder in one bulk build
+        if not os.path.exists(filename):
+            return None
+
+        manifest = read_manifest(filename)
+        directory = os.path.dirname(filename)
+        fs = FileSystem(t_value or manifest["t"], max_t=max_t)
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            groups = {}
+            jobs = [(os.path.join(directory, segment["file"]),) for segment in manifest["segments"]]
+            for segment_groups in shard_map(read_groups, jobs, workers, "forkserver"):   # parsing needs only the file
+                groups.update(segment_groups)       # segments never share a parent path
+            fs._bulk_build(groups)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        return fs
+
+    def _compact_build(self, blocks):
+        # Entries go into the tree as their records are read: the entries of each
+        # open folder are collected, already in name order, and get their B-tree
+        # once the records move past the folder. Only the open folders (one per
+        # depth) hold entries outside the tree.
+        new_node = self._new_node
+        now = time.time()
+        folders = [self.tree.root.vals[0]]         # folders[d]: open folder whose entries are at depth d + 1
+        keys = [[]]                                 # names and entries collected for each open folder
+        vals = [[]]
+
+        def close():
+            folder_node, names, nodes = folders.pop(), keys.pop(), vals.pop()
+            if names:
+                folder_node.children = FileExplorer.bulk_load(self._folder_degree(len(names)), names, nodes)
+
+        for text in blocks:
+            for line in text.split("\n"):
+                if not line:
+                    continue
+                parts = line.split("\t")
+                head = parts[0]
+                depth = int(head[1:])
+                while len(folders) > depth:
+                    close()
+                names = keys[-1]
+                name = names[-1][:int(parts[1])] + parts[2] if names else parts[2]
+                node = new_node(name, "folder" if head[0] == "d" else "file", folders[-1], now)
+                names.append(node.name)
+                vals[-1].append(node)
+                if head[0] == "d":
+                    folders.append(node)
+                    keys.append([])
+                    vals.append([])
+                elif head[0] == "c":
+                    load_contents(node, parts)
+        while folders:
+            close()
+
+    @staticmethod
+    def load_compact(filename='Data_set.btz', t_value=6, max_t=MAX_FOLDER_DEGREE):
+        if not os.path.exists(filename):
+            return None
+        fs = FileSystem(t_value, max_t=max_t)
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(filename, 'rb') as f:
+                codec, _ = read_compact_header(f)
+                fs._compact_build(read_compact_blocks(f, COMPACT_CODECS[codec][1]))
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        return fs
+
+    @staticmethod
+    def load_state(filename='Data_set.txt', t_value=6, bulk=True, max_t=MAX_FOLDER_DEGREE):
+
+        if os.path.exists(filename) and is_compact(filename):
+            return FileSystem.load_compact(filename, t_value, max_t=max_t)
+        if os.path.exists(filename) and is_manifest(filename):
+            return FileSystem.load_shards(filename, t_value, max_t=max_t)
+        if os.path.exists(filename):
+            fs = FileSystem(t_value, max_t=max_t)
+            if bulk:
+                # Loading only allocates objects that stay alive, so the cyclic GC
+                # passes it would trigger are pure overhead.
+                gc_was_enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    fs._bulk_build(read_groups(filename))
+                finally:
+                    if gc_was_enabled:
+                        gc.enable()
+                return fs
+
+            # one line at a time, straight into the tree
+            with open(filename, 'r') as f:
+                for line in f:
+                    parts = line.strip().split(',')
+                    if len(parts) != 3 and not (len(parts) == 7 and parts[0] == 'file'):
+                        continue
+                    entry_type, name, parent_path_str = parts[:3]
+                    parent_path_list = split_path(parent_path_str)
+                    try:
+                        if entry_type == 'folder':
+                            fs.create_folder(name, parent_path_list)
+                        elif entry_type == 'file':
+                            file_node = fs.create_file(name, parent_path_list)
+                            if len(parts) == 7:
+                                load_contents(file_node, parts)
+                    except FileSystemError as e:
+                        log.warning("Skipping '%s': %s", name, e)
+            return fs
+        else:
+            return None                             # nothing saved yet
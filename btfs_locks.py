@@ -0,0 +1,62 @@
+"""Locks for the concurrent mode of the B-tree file system.
+
+Each folder has a reader/writer lock, created the first time it is needed.
+Paths are locked top-down with lock coupling: the lock of a folder is taken
+before the lock of its parent is released, and no thread ever waits for a
+lock higher up the tree than one it holds.
+"""
+import threading
+
+
+class RWLock:
+    # Any number of readers or a single writer. A waiting writer blocks new
+    # readers, so a steady stream of lookups cannot starve it.
+    __slots__ = ("_cond", "_readers", "_writer", "_writers_waiting")
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+
+class LockTable:
+    def __init__(self):
+        self.folders = {}                           # folder inode id -> RWLock
+        self.tree = RWLock()                        # shared by every operation, exclusive for whole-tree reads
+        self.rename = threading.Lock()              # serializes folder moves between different parents
+
+    def get(self, folder_node):
+        lock = self.folders.get(folder_node.ino)
+        if lock is None:
+            lock = self.folders.setdefault(folder_node.ino, RWLock())
+        return lock
+
+    def pop(self, folder_node):
+        # forget a deleted folder's lock; threads already holding it keep the same object
+        return self.folders.pop(folder_node.ino, None) or RWLock()
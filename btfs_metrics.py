@@ -0,0 +1,109 @@
+"""Opt-in metrics: B-tree work and latency per file system operation.
+
+    metrics = fs.enable_metrics()
+    ...
+    fs.dump_metrics('metrics.json')                 # or metrics.dump()
+
+Each operation adds up the B-tree work it does: nodes searched, key
+comparisons (binary search probes), node splits, merges, borrows and node
+allocations, including the copies made for snapshots. Latencies go into
+power-of-two histograms, one per operation. Until enable_metrics() is called
+the engine runs the plain B-tree code, so metrics cost nothing.
+"""
+import threading
+import time
+
+COUNTERS = ("visits", "comparisons", "splits", "merges", "borrows", "allocations")
+VISITS, COMPARISONS, SPLITS, MERGES, BORROWS, ALLOCATIONS = range(len(COUNTERS))
+
+# bucket i counts latencies below 2 ** i microseconds (and at least half that), the last one everything slower
+LATENCY_BUCKETS = 26
+
+
+class OperationStats:
+    __slots__ = ("count", "errors", "seconds", "counts", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.counts = [0] * len(COUNTERS)
+        self.histogram = [0] * LATENCY_BUCKETS
+
+    def percentile(self, p):
+        # upper bound of the bucket holding the p-th percentile, in microseconds
+        rank = self.count * p / 100
+        seen = 0
+        for i, n in enumerate(self.histogram):
+            seen += n
+            if n and seen >= rank:
+                return 2 ** i
+        return 0
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.operations = {}                        # operation name -> OperationStats
+        self.lock = threading.Lock()
+
+    def record(self, op, counts, seconds, failed=False):
+        bucket = min(int(seconds * 1e6).bit_length(), LATENCY_BUCKETS - 1)
+        with self.lock:
+            stats = self.operations.get(op)
+            if stats is None:
+                stats = self.operations[op] = OperationStats()
+            stats.count += 1
+            stats.errors += failed
+            stats.seconds += seconds
+            stats.histogram[bucket] += 1
+            total = stats.counts
+            for i, n in enumerate(counts):
+                total[i] += n
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.operations = {}
+
+    def dump(self):
+        # -> a JSON-ready dict: totals, per-call averages and the latency histogram of every operation
+        with self.lock:
+            operations = {}
+            for op, stats in sorted(self.operations.items()):
+                operations[op] = {
+                    "count": stats.count,
+                    "errors": stats.errors,
+                    "seconds": stats.seconds,
+                    "totals": dict(zip(COUNTERS, stats.counts)),
+                    "per_call": {name: n / stats.count for name, n in zip(COUNTERS, stats.counts)},
+                    "latency_us": {
+                        "mean": stats.seconds * 1e6 / stats.count,
+                        "p50": stats.percentile(50),
+                        "p90": stats.percentile(90),
+                        "p99": stats.percentile(99),
+                        "max": stats.percentile(100),
+                        "bucket_limits": [2 ** i for i in range(LATENCY_BUCKETS)],
+                        "histogram": stats.histogram[:],
+                    },
+                }
+            return {"started": self.started, "elapsed": time.time() - self.started, "operations": operations}
+
+
+def tree_shape(tree):
+    # height, node count and fill factor (share of the 2t - 1 key slots in use) of one FileExplorer
+    nodes = keys = 0
+    stack = [tree.root]
+    while stack:
+        x = stack.pop()
+        nodes += 1
+        keys += len(x.keys)
+        if not x.leaf:
+            stack.extend(x.child)
+    height = 1
+    x = tree.root
+    while not x.leaf:
+        x = x.child[0]
+        height += 1
+    return {"degree": tree.t, "entries": keys, "nodes": nodes, "height": height,
+            "fill": keys / (nodes * ((2 * tree.t) - 1))}
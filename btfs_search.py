@@ -0,0 +1,107 @@
+"""Trigram index and edit distance for substring and fuzzy name search.
+
+Every name is cut into the three-character slices of its lower-cased form
+("Readme.md" -> "rea", "ead", ..., ".md"), and the index maps each slice to
+the names containing it. A name containing a fragment holds all of the
+fragment's trigrams, and a name within edit distance d of a query still holds
+all but at most 3d of the query's, so both searches only check the names that
+share enough trigrams with the query instead of every name.
+"""
+from array import array
+from collections import Counter
+from itertools import chain
+
+COMPACT_MIN = 1024                                  # removed names tolerated in the arrays whatever the index size
+CHECK_DIRECTLY = 64                                 # candidates left when the trigrams of a substring stop being intersected
+
+
+def trigrams(name):
+    # distinct trigrams of name, lower-cased
+    name = name.lower()
+    return {name[i: i + 3] for i in range(len(name) - 2)}
+
+
+def edit_distance(a, b, limit):
+    # Levenshtein distance between a and b, or limit + 1 as soon as it is known
+    # to be more than limit. Only the cells within limit of the diagonal can
+    # stay at or under limit, so each row only fills those.
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if a == b:
+        return 0
+    over = limit + 1
+    n = len(b)
+    previous = [j if j <= limit else over for j in range(n + 1)]
+    for i, ca in enumerate(a, 1):
+        low = max(1, i - limit)
+        high = min(n, i + limit)
+        current = [over] * (n + 1)
+        if i <= limit:
+            current[0] = i
+        best = current[low - 1]
+        for j in range(low, high + 1):
+            cost = previous[j - 1] + (ca != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost
+            if cost < best:
+                best = cost
+        if best > limit:
+            return over
+        previous = current
+    return min(previous[n], over)
+
+
+class TrigramIndex:
+    # Every name gets an id, and each trigram lists the ids of the names holding
+    # it in an array, 4 bytes a name. Removed names are only forgotten by id;
+    # the arrays are rebuilt once they list as many removed names as live ones.
+    def __init__(self):
+        self.ids = {}                               # name -> id
+        self.names = []                             # id -> name, None once removed
+        self.postings = {}                          # trigram -> array of the ids of the names holding it
+        self.stale = 0                              # removed names still listed in the arrays
+
+    def add(self, name):
+        postings = self.postings
+        i = len(self.names)
+        self.names.append(name)
+        self.ids[name] = i
+        for gram in trigrams(name):
+            ids = postings.get(gram)
+            if ids is None:
+                ids = postings[gram] = array('I')
+            ids.append(i)
+
+    def remove(self, name):
+        i = self.ids.pop(name, None)
+        if i is None:
+            return
+        self.names[i] = None
+        self.stale += 1
+        if self.stale > max(len(self.ids), COMPACT_MIN):
+            live = [name for name in self.names if name is not None]
+            self.__init__()
+            for name in live:
+                self.add(name)
+
+    def candidates(self, grams, minimum):
+        # names that may hold at least minimum of grams (each one still to be
+        # checked), or None if minimum rules nothing out
+        if minimum <= 0:
+            return None
+        names = self.names
+        postings = [self.postings.get(gram, ()) for gram in grams]
+        if minimum >= len(postings):
+            # a name needs every trigram: intersect from the rarest one up, until few enough are left to check
+            postings.sort(key=len)
+            found = set(postings[0])
+            for ids in postings[1:]:
+                if len(found) <= CHECK_DIRECTLY:
+                    break
+                found.intersection_update(ids)
+            return [name for name in map(names.__getitem__, found) if name is not None]
+        counts = Counter(chain.from_iterable(postings))
+        return [names[i] for i, n in counts.items() if n >= minimum and names[i] is not None]
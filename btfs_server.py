@@ -0,0 +1,217 @@
+"""asyncio network front end for the B-tree file system.
+
+Protocol: one JSON object per line in each direction.
+
+    -> {"id": 7, "op": "create_file", "args": ["main.py", ["projects"]]}
+    <- {"id": 7, "ok": true, "result": {"ino": 12, "name": "main.py", "type": "file"}}
+    <- {"id": 8, "ok": false, "error": "EntryExistsError", "message": "..."}
+
+Paths are lists of names, [] being the root folder. Clients may send any
+number of requests without waiting (pipelining); the answers come back in
+the same order. Requests that are already waiting are executed as one
+batch, and with a write-ahead log the batch is answered once its last
+change is on disk, so one fsync covers every connection's batch.
+
+    python btfs_server.py --state Data_set.txt --port 7341
+"""
+import argparse
+import asyncio
+import json
+import logging
+import signal
+
+from btfs_engine import COMPACT_CODECS, WAL_OPERATIONS, FileSystem, FileSystemError
+
+DEFAULT_B_TREE_DEGREE = 6
+DEFAULT_PORT = 7341
+MAX_BATCH = 256                                     # requests of one connection executed before answering
+
+
+def entry_info(node):
+    return {"ino": node.ino, "name": node.name, "type": node.type}
+
+
+def search_info(results):
+    return [{"path": "/".join(path), "type": node.type, "ino": node.ino} for node, path in results]
+
+
+# operation -> function turning its return value into JSON
+OPERATIONS = {
+    "create_folder": entry_info,
+    "create_file": entry_info,
+    "delete_file": entry_info,
+    "delete_folder": entry_info,
+    "rename_node": entry_info,
+    "move_file": entry_info,
+    "move_folder": entry_info,
+    "search_file": search_info,
+    "search_folder": search_info,
+    "search_prefix": search_info,
+    "search_glob": search_info,
+    "search_pattern": search_info,
+    "search_substring": search_info,
+    "search_fuzzy": search_info,
+    "list_dir": lambda nodes: [entry_info(node) for node in nodes],
+    "stat": lambda info: info,
+    "rank": lambda position: position,
+    "apply_batch": lambda nodes: [entry_info(node) for node in nodes],
+    "du": lambda size: size,
+    "count": lambda counts: {"files": counts[0], "folders": counts[1]},
+}
+
+
+class Server:
+    def __init__(self, fs, max_batch=MAX_BATCH):
+        self.fs = fs
+        self.max_batch = max_batch
+        self.waiters = []                           # (lsn, future) waiting for the WAL to reach lsn
+        self.flushing = False
+
+    def execute(self, line):
+        # -> (response, True if the request changed the file system)
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            op = request["op"]
+            if op not in OPERATIONS:
+                raise ValueError(f"unknown operation '{op}'")
+            result = OPERATIONS[op](getattr(self.fs, op)(*request.get("args", [])))
+        except FileSystemError as e:
+            return {"id": request_id, "ok": False, "error": type(e).__name__, "message": str(e)}, False
+        except (ValueError, KeyError, TypeError, AttributeError) as e:  # not JSON, no such op, bad arguments
+            return {"id": request_id, "ok": False, "error": "BadRequest", "message": str(e)}, False
+        return {"id": request_id, "ok": True, "result": result}, op in WAL_OPERATIONS
+
+    async def durable(self, lsn):
+        # Resolves once the log is on disk up to lsn. A single executor thread
+        # waits for the newest record anyone asked for, so concurrent batches
+        # share the same fsync.
+        wal = self.fs.wal
+        if wal is None or wal.durable_lsn >= lsn:
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append((lsn, future))
+        if not self.flushing:
+            self.flushing = True
+            asyncio.get_running_loop().create_task(self._flush())
+        await future
+
+    async def _flush(self):
+        loop = asyncio.get_running_loop()
+        wal = self.fs.wal
+        try:
+            while self.waiters:
+                target = max(lsn for lsn, _ in self.waiters)
+                await loop.run_in_executor(None, wal.wait, target)
+                done = wal.durable_lsn
+                still_waiting = []
+                for lsn, future in self.waiters:
+                    if lsn <= done:
+                        if not future.done():
+                            future.set_result(None)
+                    else:
+                        still_waiting.append((lsn, future))
+                self.waiters = still_waiting
+        finally:
+            self.flushing = False
+
+    async def handle(self, reader, writer):
+        requests = asyncio.Queue(maxsize=4 * self.max_batch)
+
+        async def read():
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    await requests.put(line)
+            finally:
+                await requests.put(None)
+
+        reader_task = asyncio.get_running_loop().create_task(read())
+        try:
+            done = False
+            while not done:
+                batch = [await requests.get()]
+                while len(batch) < self.max_batch and not requests.empty():
+                    batch.append(requests.get_nowait())
+                responses = []
+                changed = False
+                for line in batch:
+                    if line is None:
+                        done = True
+                        break
+                    if not line.strip():
+                        continue
+                    response, mutation = self.execute(line)
+                    responses.append(json.dumps(response).encode() + b"\n")
+                    changed = changed or mutation
+                if changed and self.fs.wal is not None:
+                    await self.durable(self.fs.wal.lsn)
+                if responses:
+                    writer.write(b"".join(responses))
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            reader_task.cancel()
+            writer.close()
+
+
+async def serve(fs, host="127.0.0.1", port=DEFAULT_PORT, unix=None, max_batch=MAX_BATCH):
+    server = Server(fs, max_batch)
+    if unix:
+        return await asyncio.start_unix_server(server.handle, path=unix)
+    return await asyncio.start_server(server.handle, host, port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--state", metavar="FILE", help="checkpoint + write-ahead log to recover and keep (in memory only if omitted)")
+    parser.add_argument("--compact", choices=sorted(COMPACT_CODECS), help="write checkpoints as compact snapshots with this codec")
+    parser.add_argument("-t", type=int, default=DEFAULT_B_TREE_DEGREE, help="B-tree degree")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--index", action="store_true", help="keep the name index for searches")
+    parser.add_argument("--trigrams", action="store_true", help="keep the name index with trigrams, for substring/fuzzy searches")
+    parser.add_argument("--totals", action="store_true", help="keep folder totals so du/count take O(depth)")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--metrics", metavar="FILE", help="record operation metrics and write them here on shutdown")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format=" %(message)s")
+
+    if args.state:
+        # answers wait for the log asynchronously, so operations themselves must not block on it
+        fs = FileSystem.recover(args.state, args.t, sync_commit=False, compact=args.compact)
+    else:
+        fs = FileSystem(args.t)
+    if args.index or args.trigrams:
+        fs.enable_index(trigrams=args.trigrams)
+    if args.metrics:
+        fs.enable_metrics()
+    if args.totals:
+        fs.enable_totals()
+
+    async def run():
+        server = await serve(fs, args.host, args.port, args.unix, args.max_batch)
+        where = args.unix or "{}:{}".format(*server.sockets[0].getsockname()[:2])
+        print(f"listening on {where}", flush=True)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        async with server:
+            await stop.wait()
+
+    try:
+        asyncio.run(run())
+    finally:
+        fs.close()                                  # final checkpoint
+        if args.metrics:
+            fs.dump_metrics(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Write-ahead log for the B-tree file system.
+
+Every mutation is appended as one JSON line ``{"lsn": ..., "op": ..., "args": [...]}``
+to a segment file next to the checkpoint it applies to (``Data_set.txt.wal.000001``,
+``Data_set.txt.wal.000002``, ...).  A background flusher fsyncs the log in groups:
+appenders that arrive while a flush is pending share the same fsync.
+"""
+import json
+import os
+import threading
+
+SEGMENT_TAG = ".wal."
+
+
+def segment_files(base):
+    directory = os.path.dirname(base) or "."
+    prefix = os.path.basename(base) + SEGMENT_TAG
+    segments = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name[len(prefix):].isdigit():
+            segments.append((int(name[len(prefix):]), os.path.join(directory, name)))
+    return sorted(segments)
+
+
+def read_records(base, after_lsn=0):
+    for _, path in segment_files(base):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:                  # torn write at the tail of a crashed segment
+                    break
+                if record["lsn"] > after_lsn:
+                    yield record
+
+
+def remove_segments(base, before_seq=None):
+    for seq, path in segment_files(base):
+        if before_seq is None or seq < before_seq:
+            os.remove(path)
+
+
+def fsync_dir(path):
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:                                 # directories cannot be opened on every platform
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class WriteAheadLog:
+    def __init__(self, base, start_lsn=0, sync_commit=True, commit_interval=0.002, commit_batch=512):
+        self.base = base
+        self.sync_commit = sync_commit              # if True, callers wait until their record is on disk
+        self.commit_interval = commit_interval      # how long a flush waits for more records to join it
+        self.commit_batch = commit_batch            # flush right away once this many records are pending
+        self.lsn = start_lsn
+        self.durable_lsn = start_lsn
+        self.closed = False
+
+        # Always start a fresh segment: the last one may end with a torn record.
+        segments = segment_files(base)
+        self.seq = segments[-1][0] + 1 if segments else 1
+        self.file = open(self._segment_path(self.seq), 'a', encoding='utf-8')
+
+        self.cond = threading.Condition()
+        self.io_lock = threading.Lock()             # orders fsync against rotate; always taken before cond
+        self.flusher = threading.Thread(target=self._flush_loop, name="wal-flusher", daemon=True)
+        self.flusher.start()
+
+    def _segment_path(self, seq):
+        return f"{self.base}{SEGMENT_TAG}{seq:06d}"
+
+    def append(self, op, *args):
+        with self.cond:
+            if self.closed:
+                raise ValueError("write-ahead log is closed")
+            self.lsn += 1
+            self.file.write(json.dumps({"lsn": self.lsn, "op": op, "args": args}) + "\n")
+            self.cond.notify_all()
+            return self.lsn
+
+    def wait(self, lsn):
+        with self.cond:
+            while self.durable_lsn < lsn:
+                self.cond.wait()
+
+    def _flush_loop(self):
+        while True:
+            with self.cond:
+                while self.durable_lsn == self.lsn and not self.closed:
+                    self.cond.wait()
+                if self.durable_lsn == self.lsn:
+                    return
+                # let concurrent appenders join this group before paying for the fsync
+                self.cond.wait_for(lambda: self.closed or self.lsn - self.durable_lsn >= self.commit_batch,
+                                   self.commit_interval)
+            with self.io_lock:
+                with self.cond:
+                    self.file.flush()
+                    lsn = self.lsn
+                os.fsync(self.file.fileno())
+            with self.cond:
+                self.durable_lsn = max(self.durable_lsn, lsn)
+                self.cond.notify_all()
+
+    def rotate(self):
+        # Close the current segment and continue in a new one. Returns the last
+        # lsn written before the switch and the sequence number of the new segment.
+        with self.io_lock, self.cond:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.durable_lsn = self.lsn
+            self.cond.notify_all()
+            self.seq += 1
+            self.file = open(self._segment_path(self.seq), 'a', encoding='utf-8')
+            return self.lsn, self.seq
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.flusher.join()
+        self.file.close()
@@ -0,0 +1,116 @@
+import os
+
+import pytest
+
+from btfs_blocks import BLOCK_SIZE, ExtentAllocator
+from btfs_engine import ContentsLostError, FileSystem
+
+
+def session(tmp_path, load, t=3):
+    fs = FileSystem.recover(str(tmp_path / "Data_set.txt"), t) if load else FileSystem(t)
+    fs.enable_blocks(str(tmp_path / "Data_set.blocks"))
+    return fs
+
+
+def test_fresh_session_keeps_the_saved_contents(tmp_path):
+    a = b"a" * 11000
+    fs = session(tmp_path, True)
+    fs.create_file("a.txt")
+    fs.write_file("a.txt", a)
+    fs.close()
+
+    fs = session(tmp_path, False)                   # started fresh on the same block file, never saved
+    fs.create_file("b.txt")
+    fs.write_file("b.txt", b"b" * 8192)
+    fs.close()
+
+    fs = session(tmp_path, True)
+    assert bytes(fs.read_file("a.txt")) == a
+    fs.close()
+
+
+def test_fresh_session_saved_over_the_state_reuses_its_blocks(tmp_path):
+    fs = session(tmp_path, True)
+    fs.create_file("a.txt")
+    fs.write_file("a.txt", b"a" * 11000)
+    fs.close()
+
+    fs = session(tmp_path, False)
+    fs.create_file("b.txt")
+    fs.save_state(str(tmp_path / "Data_set.txt"))   # a.txt is gone from every saved state now
+    fs.write_file("b.txt", b"b" * 8192)
+    fs.save_state(str(tmp_path / "Data_set.txt"))
+    fs.close()
+    assert os.path.getsize(tmp_path / "Data_set.blocks") == 8192
+
+    fs = session(tmp_path, True)
+    assert bytes(fs.read_file("b.txt")) == b"b" * 8192
+    fs.close()
+
+
+def test_missing_blocks_raise_a_file_system_error(tmp_path):
+    fs = session(tmp_path, False)
+    fs.create_file("a.txt")
+    fs.write_file("a.txt", b"a" * 11000)
+    os.truncate(tmp_path / "Data_set.blocks", 4096)
+    with pytest.raises(ContentsLostError):
+        fs.read_file("a.txt")
+    fs.close()
+
+
+def test_crash_after_rewrite_leaves_the_saved_contents(tmp_path):
+    fs = session(tmp_path, False)
+    fs.create_file("a.txt")
+    fs.create_file("c.txt")
+    fs.write_file("a.txt", b"old" * 3000)
+    fs.save_state(str(tmp_path / "Data_set.txt"))
+    fs.close()
+
+    fs = FileSystem.load_state(str(tmp_path / "Data_set.txt"), 3)
+    fs.enable_blocks(str(tmp_path / "Data_set.blocks"))
+    fs.write_file("a.txt", b"new" * 3000)
+    fs.write_file("c.txt", b"c" * 9000)             # must not land on the blocks a.txt had when saved
+    fs.delete_file("a.txt")
+    fs.write_file("c.txt", b"d" * 9000)
+    # crash: neither saved nor closed
+
+    fs = FileSystem.load_state(str(tmp_path / "Data_set.txt"), 3)
+    fs.enable_blocks(str(tmp_path / "Data_set.blocks"))
+    assert bytes(fs.read_file("a.txt")) == b"old" * 3000
+    fs.close()
+
+
+def test_allocator_is_first_fit_and_merges_free_extents():
+    allocator = ExtentAllocator()
+    assert [allocator.allocate(n) for n in (2, 3, 1)] == [[(0, 2)], [(2, 3)], [(5, 1)]]
+    allocator.free(0, 2)
+    allocator.free(2, 3)                            # merged with the extent before it
+    assert (allocator.starts, allocator.counts) == ([0], [5])
+    assert allocator.allocate(4) == [(0, 4)]
+    allocator.free(5, 1)                            # merged, and at the end: the file shrinks instead
+    assert (allocator.starts, allocator.counts, allocator.end) == ([], [], 4)
+
+
+def test_rewritten_and_deleted_blocks_are_reused_after_a_save(tmp_path):
+    fs = session(tmp_path, False)
+    fs.create_file("a.txt")
+    fs.create_file("b.txt")
+    fs.write_file("a.txt", b"1" * 3 * BLOCK_SIZE)
+    fs.write_file("a.txt", b"2" * 3 * BLOCK_SIZE)
+    fs.write_file("b.txt", b"3" * BLOCK_SIZE)
+    assert fs.lookup(["b.txt"]).extents == [(6, 1)]   # nothing given back before a save
+    fs.save_state(str(tmp_path / "Data_set.txt"))
+    fs.delete_file("b.txt")
+    fs.create_file("c.txt")
+    fs.write_file("c.txt", b"4" * 2 * BLOCK_SIZE)
+    assert fs.lookup(["c.txt"]).extents == [(0, 2)]   # the first blocks of a.txt
+    fs.save_state(str(tmp_path / "Data_set.txt"))
+    fs.close()
+    assert os.path.getsize(tmp_path / "Data_set.blocks") == 6 * BLOCK_SIZE   # b.txt's block was the last one
+
+    fs = FileSystem.load_state(str(tmp_path / "Data_set.txt"), 3)
+    fs.enable_blocks(str(tmp_path / "Data_set.blocks"))
+    assert bytes(fs.read_file("a.txt")) == b"2" * 3 * BLOCK_SIZE
+    assert bytes(fs.read_file("c.txt")) == b"4" * 2 * BLOCK_SIZE
+    assert (fs.blocks.allocator.starts, fs.blocks.allocator.counts) == ([2], [1])
+    fs.close()
@@ -0,0 +1,43 @@
+import pytest
+
+from btfs_engine import FileSystem
+
+
+@pytest.mark.parametrize("bulk", [True, False])
+def test_contents_survive_save_and_load(tmp_path, bulk):
+    fs = FileSystem(3)
+    fs.enable_blocks(str(tmp_path / "Data_set.blocks"))
+    fs.create_folder("docs")
+    fs.create_file("a.txt", ["docs"])
+    fs.create_file("empty.txt", ["docs"])
+    data = bytes(range(256)) * 40
+    fs.write_file("a.txt", data, ["docs"])
+    before = fs.stat(["docs", "a.txt"])
+    fs.save_state(str(tmp_path / "Data_set.txt"))
+
+    loaded = FileSystem.load_state(str(tmp_path / "Data_set.txt"), 3, bulk=bulk)
+    loaded.enable_blocks(str(tmp_path / "Data_set.blocks"))
+    after = loaded.stat(["docs", "a.txt"])
+    assert [after[key] for key in ("size", "mtime", "ctime")] == [before[key] for key in ("size", "mtime", "ctime")]
+    assert bytes(loaded.read_file("a.txt", ["docs"])) == data
+    assert bytes(loaded.read_file("empty.txt", ["docs"])) == b""
+
+
+@pytest.mark.parametrize("save, filename", [("save_state", "Data_set.txt"), ("save_shards", "Data_set.shards"),
+                                            ("save_compact", "Data_set.btz")])
+def test_contents_fields_in_every_format(tmp_path, save, filename):
+    fs = FileSystem(3)
+    fs.create_folder("docs")
+    for i in range(20):
+        fs.create_file(f"f{i}", ["docs"])
+    node = fs.lookup(["docs", "f7"])
+    node.size, node.mtime, node.ctime, node.extents = 12345, 1700000000.25, 1600000000.5, [(9, 2), (40, 2)]
+    empty = fs.lookup(["docs", "f8"])
+    empty.size, empty.extents = 0, []               # written once, with nothing
+    getattr(fs, save)(str(tmp_path / filename))
+
+    loaded = FileSystem.load_state(str(tmp_path / filename), 3)
+    node = loaded.lookup(["docs", "f7"])
+    assert (node.size, node.mtime, node.ctime, node.extents) == (12345, 1700000000.25, 1600000000.5, [(9, 2), (40, 2)])
+    assert loaded.lookup(["docs", "f8"]).extents == []
+    assert loaded.lookup(["docs", "f9"]).extents is None
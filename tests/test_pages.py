@@ -0,0 +1,20 @@
+from btfs_engine import FileSystem
+
+
+def test_contents_survive_page_file(tmp_path):
+    fs = FileSystem(3)
+    fs.enable_blocks(str(tmp_path / "Data_set.blocks"))
+    for i in range(40):                             # enough entries for several pages and internal nodes
+        fs.create_file(f"f{i:02}")
+    data = b"x" * 10000
+    fs.write_file("f07", data)
+    before = fs.stat(["f07"])
+    fs.save_pages(str(tmp_path / "Data_set.btfs"))
+
+    loaded = FileSystem.load_pages(str(tmp_path / "Data_set.btfs"))
+    loaded.enable_blocks(str(tmp_path / "Data_set.blocks"))
+    after = loaded.stat(["f07"])
+    assert [after[key] for key in ("size", "mtime", "ctime")] == [before[key] for key in ("size", "mtime", "ctime")]
+    assert bytes(loaded.read_file("f07")) == data
+    loaded.write_file("f08", b"y" * 5000)           # must not be given the blocks of f07
+    assert bytes(loaded.read_file("f07")) == data
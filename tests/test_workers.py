@@ -0,0 +1,53 @@
+import threading
+
+import btfs_engine
+from btfs_engine import FileSystem
+
+
+def paged(tmp_path):
+    fs = FileSystem(3, max_t=3)
+    for i in range(4):
+        fs.create_folder(f"d{i}")
+        for j in range(50):
+            fs.create_file(f"f{j:02}", [f"d{i}"])
+    fs.save_pages(str(tmp_path / "Data_set.btfs"))
+    loaded = FileSystem.load_pages(str(tmp_path / "Data_set.btfs"), max_t=3)
+    loaded.list_dir()                               # top level decoded here, the folders below by the workers
+    return fs, loaded
+
+
+def while_page_lock_is_held(pages, func):
+    # run func while another thread holds the page file's lock for a moment
+    taken = threading.Event()
+
+    def hold():
+        with pages.lock:
+            taken.set()
+            threading.Event().wait(0.3)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    taken.wait()
+    result = []
+    worker = threading.Thread(target=lambda: result.append(func()), daemon=True)
+    worker.start()
+    worker.join(60)
+    holder.join()
+    assert not worker.is_alive(), "forked workers deadlocked on the page lock"
+    return result[0]
+
+
+def test_sharded_save_forks_safely_while_pages_are_decoded(tmp_path):
+    fs, loaded = paged(tmp_path)
+    filename = str(tmp_path / "Data_set.shards")
+    while_page_lock_is_held(loaded.pages, lambda: loaded.save_shards(filename, workers=2))
+    assert list(FileSystem.load_shards(filename, workers=2).iter_state_lines()) == list(fs.iter_state_lines())
+
+
+def test_parallel_scan_forks_safely_while_pages_are_decoded(tmp_path, monkeypatch):
+    monkeypatch.setattr(btfs_engine, "PARALLEL_SCAN_MIN_ENTRIES", 1)
+    monkeypatch.setattr(btfs_engine, "SCAN_JOBS_PER_WORKER", 1)   # the top folders are the jobs
+    fs, loaded = paged(tmp_path)
+    loaded.scan_workers = 2
+    found = while_page_lock_is_held(loaded.pages, lambda: loaded.search_file("f07"))
+    assert [path for _, path in found] == [["root", f"d{i}", "f07"] for i in range(4)]